@@ -0,0 +1,75 @@
+import bisect
+from collections import deque
+
+
+class BacklogQueue:
+    """
+    Priority queue of backlogged defects. Priority levels are small integers (lower = higher priority), so defects are
+    kept in one FIFO bucket per priority level: push and pop are O(1) and insertion order is kept within a level.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.levels = [] # priority levels in ascending order
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """
+        Iterates over the (priority level, defect row) tuples in the order they would be popped.
+        """
+        for level in self.levels:
+            for defect in self.buckets[level]:
+                yield level, defect
+
+    def bucket(self, priority):
+        """
+        Returns the FIFO bucket of a priority level, creating it if needed.
+
+        Args
+            :priority (int): priority level
+        Returns
+            :bucket (deque): backlogged defects of this priority level, oldest first
+        """
+        if priority not in self.buckets:
+            bisect.insort(self.levels, priority)
+            self.buckets[priority] = deque()
+        return self.buckets[priority]
+
+    def push(self, priority, defect):
+        """
+        Adds a defect to the back of its priority level.
+
+        Args
+            :priority (int): priority level
+            :defect (int): defect row in defect_log
+        """
+        self.bucket(priority).append(defect)
+        self.size += 1
+
+    def push_many(self, priority, defects):
+        """
+        Adds a block of defects of the same priority level, in order.
+
+        Args
+            :priority (int): priority level
+            :defects (iterable): defect rows in defect_log
+        """
+        bucket = self.bucket(priority)
+        size = len(bucket)
+        bucket.extend(defects)
+        self.size += len(bucket) - size
+
+    def pop(self):
+        """
+        Removes the oldest defect of the highest priority level.
+
+        Returns
+            :item (tuple): (priority level, defect row)
+        """
+        for level in self.levels:
+            if self.buckets[level]:
+                self.size -= 1
+                return level, self.buckets[level].popleft()
+        raise IndexError('pop from an empty backlog queue')
@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+import numpy as np
+from collections.abc import Mapping
+from DefectStore import DefectStore
+
+
+class Checkpoint(Mapping):
+    """
+    Versioned columnar checkpoint of a simulation, in place of a pickled comparison_dict. It is a directory holding
+    manifest.json (format, version, defect types and the metadata of each trial) and, per trial, uncompressed Arrow IPC
+    files with the columns of DefectStore: the defects (trialN.arrow), the explicit open-defect set with the processing
+    queue of the defects in flight (trialN.open.arrow), and the closed history moved to cold storage, if any
+    (trialN.coldK.arrow segments, only read for the full history). Trials are read lazily: indexing the checkpoint only
+    returns a CheckpointTrial, whose files are memory-mapped on first access.
+    """
+    format = 'defect-backlog-checkpoint'
+    version = 2 # 1: no open-defect set nor cold storage
+
+    def __init__(self, path):
+        manifest_path = os.path.join(path, 'manifest.json')
+        if not os.path.isfile(manifest_path):
+            raise ValueError(f"path_initial_state: Must be a checkpoint directory holding manifest.json, got '{path}'")
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+        if manifest.get('format') != self.format:
+            raise ValueError(f"path_initial_state: Must be a {self.format} manifest, got format {manifest.get('format')!r}")
+        if manifest['version'] > self.version:
+            raise ValueError(f"path_initial_state: Must be a checkpoint of version {self.version} or lower, got version {manifest['version']}")
+        self.path = path
+        self.manifest = manifest
+
+    def __getitem__(self, trial):
+        return CheckpointTrial(self.path, self.manifest['defect_types'], self.manifest['trials'][trial])
+
+    def __iter__(self):
+        return iter(self.manifest['trials'])
+
+    def __len__(self):
+        return len(self.manifest['trials'])
+
+    @classmethod
+    def export(cls, path, comparison_dict, cold_history=False):
+        """
+        Writes the simulation results as a checkpoint directory. Each file is written aside and then renamed, so a
+        checkpoint being read (or memory-mapped) is never seen half written.
+
+        Args
+            :path (str): checkpoint directory
+            :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations
+            :cold_history (bool): if the remediated defects are moved to a cold storage segment, so that resuming only reads the open defects
+        Returns
+            :checkpoint (Checkpoint): checkpoint written
+        """
+        os.makedirs(path, exist_ok=True)
+        manifest = {'format': cls.format, 'version': cls.version, 'defect_types': None, 'trials': {}}
+        for trial, results in comparison_dict.items():
+            defect_log = results['defect_log']
+            manifest['defect_types'] = defect_log.defect_types
+            open_rows = defect_log.open_rows()
+            cold = [carry_segment(segment, path) for segment in defect_log.cold_segments]
+            cold_defects = int(sum(rows for _, rows in cold))
+            history_end = defect_log.history_end
+            if cold_history:
+                ### the remediated defects move to a new cold segment, the trial file only keeps the open ones
+                closed = np.flatnonzero(~np.isnan(defect_log['processing_end_time']))
+                if len(closed) > 0:
+                    cold.append((write_table(path, f'{trial}.cold{len(cold)+1}.arrow', defect_log.select(closed)), len(closed)))
+                    cold_defects += len(closed)
+                hot_log, hot_open = defect_log.select(open_rows), np.arange(len(open_rows))
+                history_end = float(results['t_end'])
+            else:
+                hot_log, hot_open = defect_log, open_rows
+            write_table(path, f'{trial}.arrow', hot_log)
+            write_table(path, f'{trial}.open.arrow', {'row': hot_open, 'lane': defect_log.in_flight_lanes(open_rows)})
+            manifest['trials'][trial] = {'file': f'{trial}.arrow',
+                                         'open': f'{trial}.open.arrow',
+                                         'cold': [segment for segment, _ in cold],
+                                         'cold_rows': [rows for _, rows in cold],
+                                         'defects': len(hot_log) + cold_defects,
+                                         'open_defects': len(open_rows),
+                                         'history_end': float(history_end),
+                                         't_end': float(results['t_end']),
+                                         'time_step': float(results['time_step']),
+                                         'simulation_time': float(results['simulation_time']),
+                                         'id_prefix': defect_log.id_prefix,
+                                         'next_id': int(defect_log.next_id)}
+        with open(os.path.join(path, 'manifest.json.tmp'), 'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(os.path.join(path, 'manifest.json.tmp'), os.path.join(path, 'manifest.json'))
+        return cls(path)
+
+
+class CheckpointTrial(Mapping):
+    """
+    Initial state of a single trial in a checkpoint, with the keys of a comparison_dict entry ('t_end', 'time_step',
+    'simulation_time', 'defect_log') plus 'open_defects', the explicit open-defect set (version 2). The metadata comes
+    from the manifest; the files are only read, memory-mapped, when first accessed, so sending the trial to a worker
+    process costs no more than its path. The defect log holds the defects of the trial file only, the closed history in
+    cold storage is left out (see full_defect_log).
+    """
+    def __init__(self, path, defect_types, metadata):
+        self.path = path
+        self.defect_types = defect_types
+        self.metadata = metadata
+        self.defect_log = None
+
+    def __getitem__(self, key):
+        if key == 'defect_log':
+            if self.defect_log is None:
+                self.defect_log = self.load_defect_log()
+            return self.defect_log
+        if key == 'open_defects':
+            if 'open' not in self.metadata:
+                raise KeyError(key) # version 1, the open defects are found by a scan of the defect log
+            open_df = read_table(os.path.join(self.path, self.metadata['open']))
+            return open_df['row'].to_numpy().astype(np.int64), open_df['lane'].to_numpy().astype(np.int64)
+        return self.metadata[key]
+
+    def __contains__(self, key):
+        return key in ('simulation_time', 't_end', 'time_step', 'defect_log') or (key == 'open_defects' and 'open' in self.metadata)
+
+    def __iter__(self):
+        return iter(('simulation_time', 't_end', 'time_step', 'defect_log'))
+
+    def __len__(self):
+        return 4
+
+    def __getstate__(self):
+        ### workers read the defect log from the file themselves
+        state = self.__dict__.copy()
+        state['defect_log'] = None
+        return state
+
+    def load_defect_log(self):
+        """
+        Reads the defects of the trial file (memory-mapped), with a reference to the cold segments of its closed history.
+
+        Returns
+            :defect_log (DefectStore): simulation defect log of the trial
+        """
+        defect_log = self.read_store(os.path.join(self.path, self.metadata['file']))
+        defect_log.cold_segments = tuple((os.path.join(self.path, segment), rows) for segment, rows in zip(self.metadata.get('cold', []), self.metadata.get('cold_rows', [])))
+        defect_log.history_end = self.metadata.get('history_end', 0.0)
+        return defect_log
+
+    def full_defect_log(self):
+        """
+        Reads the whole history of the trial, the cold segments (oldest first) followed by the trial file.
+
+        Returns
+            :defect_log (DefectStore): simulation defect log of the trial, closed history included
+        """
+        files = [os.path.join(self.path, segment) for segment in self.metadata.get('cold', [])] + [os.path.join(self.path, self.metadata['file'])]
+        stores = [self.read_store(file) for file in files]
+        return DefectStore.from_columns(self.defect_types,
+                                        {column: np.concatenate([store[column] for store in stores]) for column in DefectStore.columns},
+                                        self.metadata['id_prefix'],
+                                        self.metadata['next_id'])
+
+    def read_store(self, file):
+        """
+        Reads a table of defects (memory-mapped) into a DefectStore.
+        """
+        defect_df = read_table(file)
+        return DefectStore.from_columns(self.defect_types,
+                                        {column: defect_df[column].to_numpy() for column in DefectStore.columns},
+                                        self.metadata['id_prefix'],
+                                        self.metadata['next_id'])
+
+
+def write_table(path, file_name, columns):
+    """
+    Writes a table (DefectStore or dict of arrays) as an uncompressed Arrow IPC file, so it can be memory-mapped.
+
+    Args
+        :path (str): checkpoint directory
+        :file_name (str): name of the file in the checkpoint directory
+        :columns (DefectStore or dict): table to write
+    Returns
+        :file_name (str): name of the file in the checkpoint directory
+    """
+    import polars as pl
+    if isinstance(columns, DefectStore):
+        columns = {column: columns[column] for column in DefectStore.columns}
+    pl.DataFrame(columns).write_ipc(os.path.join(path, file_name + '.tmp'), compression='uncompressed')
+    os.replace(os.path.join(path, file_name + '.tmp'), os.path.join(path, file_name))
+    return file_name
+
+
+def read_table(file):
+    """
+    Reads an Arrow IPC file (memory-mapped by the Polars scan, the files being written uncompressed; read_ipc has no
+    memory_map argument from Polars 2 on).
+    """
+    import polars as pl
+    return pl.scan_ipc(file).collect()
+
+
+def carry_segment(segment, path):
+    """
+    Carries a cold segment of a loaded checkpoint over to the checkpoint being written: kept as is in the same
+    directory, hard-linked (or copied) into another one, or referenced where it lies if it was moved away.
+
+    Args
+        :segment (tuple): path of the segment file and its number of defects
+        :path (str): checkpoint directory being written
+    Returns
+        :segment (tuple): path of the segment file (relative to path if inside) and its number of defects
+    """
+    file, rows = segment
+    target = os.path.join(path, os.path.basename(file))
+    if not os.path.exists(file):
+        return os.path.abspath(file), rows # moved to cold storage, referenced where it lies
+    if not os.path.exists(target) or not os.path.samefile(file, target):
+        try:
+            os.link(file, target)
+        except OSError:
+            shutil.copy2(file, target)
+    return os.path.basename(file), rows
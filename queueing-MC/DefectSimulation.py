@@ -1,8 +1,10 @@
 import numpy as np
 import heapq as hq
-import queue
 import contextlib
-from scipy.stats import skewnorm
+from DefectStore import DefectStore
+from BacklogQueue import BacklogQueue
+from DistributionSampler import AliasTable, DistributionSampler, InverseCDF
+from ProcessingLanes import ProcessingLanes
 
 
 class DefectRemediationSimulator:
@@ -18,7 +20,10 @@ class DefectRemediationSimulator:
                  initial_backlogs,
                  t_end,
                  resources,
-                 resources_qmax):
+                 resources_qmax,
+                 id_prefix='ID',
+                 seed=None,
+                 remediation_resolution=0):
         self.defect_types = defect_types
         if len(defect_priority) == len(defect_types):
             defect_priority_dict = {name: defect_priority[index] for index, name in enumerate(defect_types)}
@@ -59,6 +64,11 @@ class DefectRemediationSimulator:
         self.t_end = t_end
         self.resources = resources
         self.resources_qmax = resources_qmax
+        self.id_prefix = id_prefix
+        if remediation_resolution < 0:
+            raise ValueError("remediation_resolution: Must be zero (no quantization) or a positive number of hours")
+        self.remediation_resolution = remediation_resolution
+        self.seed_sequence = np.random.SeedSequence(seed) # root of all the random streams, fresh entropy if seed is None
 
     def generate_type_dict(self):
         """
@@ -80,6 +90,31 @@ class DefectRemediationSimulator:
         }    
         self.defect_type_dict = defect_type_dict
         return defect_type_dict
+
+    def spawn_seed_sequences(self, seed_sequence, n):
+        """
+        Independent child seed sequences of seed_sequence. Unlike SeedSequence.spawn, the same children are returned on
+        every call, so a trial replays the same random streams wherever (and however often) it runs.
+
+        Args
+            :seed_sequence (Numpy SeedSequence): parent seed sequence
+            :n (int): number of child seed sequences
+        Returns
+            :children (list): child seed sequences (Numpy SeedSequence)
+        """
+        return [np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (i,)) for i in range(n)]
+
+    def trial_seed_sequences(self, trials):
+        """
+        Seed sequences of the Monte Carlo trials, one independent random stream per trial.
+
+        Args
+            :trials (int): number of trials
+        Returns
+            :seed_sequences (list): seed sequence of each trial (Numpy SeedSequence)
+        """
+        trial_root = self.spawn_seed_sequences(self.seed_sequence, 2)[1] # child 0 seeds the distributions
+        return self.spawn_seed_sequences(trial_root, trials)
     
     def generate_distributions(self, size=1000):
         """
@@ -91,76 +126,164 @@ class DefectRemediationSimulator:
             :incoming_distributions (dict): incoming defect incidence rate histograms (per defect type)
             :outgoing_distributions (dict): outgoing defect remediation time histograms (per defect type)
         """
+        from scipy.stats import skewnorm # only needed here, keeps scipy out of the CLI start-up
         # distributions = []
         incoming_distributions = {}
         outgoing_distributions = {}
-        for name in self.defect_types:
+        distribution_root = self.spawn_seed_sequences(self.seed_sequence, 2)[0]
+        for name, seed_sequence in zip(self.defect_types, self.spawn_seed_sequences(distribution_root, len(self.defect_types))):
+            rng = np.random.default_rng(seed_sequence) # one random stream per defect type
             #### "Incoming distribution" samples incoming defects/hr ####
             maxValue= self.maxValue_incoming[name]
-            samples_incoming = skewnorm.rvs(self.skewness_incoming[name], size=size)
+            samples_incoming = skewnorm.rvs(self.skewness_incoming[name], size=size, random_state=rng)
             samples_incoming_pos = samples_incoming - min(samples_incoming)              # positive values only   
             samples_incoming_pos = samples_incoming_pos / max(samples_incoming_pos)      # standadize all the values between 0 and 1 
             samples_incoming_pos = samples_incoming_pos * maxValue                       # spread the standardized values over the range defined by "maxValue"
 
             #### "Outgoing distribution" samples remediation time [hrs] #### 
             maxValue_outgoing = self.maxValue_outgoing[name]
-            samples_outgoing = skewnorm.rvs(self.skewness_outgoing[name], size=size)
+            samples_outgoing = skewnorm.rvs(self.skewness_outgoing[name], size=size, random_state=rng)
             samples_outgoing_pos = samples_outgoing - min(samples_outgoing)           
             samples_outgoing_pos = samples_outgoing_pos / max(samples_outgoing_pos)
             samples_outgoing_pos = samples_outgoing_pos * maxValue_outgoing
             
             incoming_distributions[name] = np.round(samples_incoming_pos) # rounds to nearest integer, for values exactly halfway between, rounds to the nearest even value, e.g. 1.5 and 2.5 round to 2.0, -0.5 and 0.5 round to 0.0
-            outgoing_distributions[name] = samples_outgoing_pos
+            outgoing_distributions[name] = self.quantize_remediation(samples_outgoing_pos)
 
         self.generation_distributions = incoming_distributions
         self.remediation_distributions = outgoing_distributions
+        ### sampling tables, built once and shared by every trial: whole numbers of incoming defects, continuous remediation times
+        self.generation_tables = {name: AliasTable.from_samples(samples) for name, samples in incoming_distributions.items()}
+        self.remediation_tables = {name: InverseCDF.from_samples(samples) for name, samples in outgoing_distributions.items()}
         return incoming_distributions, outgoing_distributions
     
-    def compute_time_step(self):
+    def quantize_remediation(self, samples):
         """
-        Computes simulation time step from generation and remediation histograms.
+        Rounds remediation times to the nearest multiple of remediation_resolution (unchanged if 0). A nonzero time never
+        rounds down to 0, which would mean the defect is never remediated.
 
+        Args
+            :samples (Numpy array): remediation times, in hours
         Returns
-            :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
+            :samples (Numpy array): quantized remediation times, in hours
+        """
+        if self.remediation_resolution == 0:
+            return samples
+        steps = np.where(samples > 0, np.maximum(np.round(samples / self.remediation_resolution), 1), 0)
+        return steps * self.remediation_resolution
+
+    def time_steps(self):
+        """
+        Time step resolving the remediation histogram of each defect type on its own.
+
+        Returns
+            :time_steps (dict): 1/2 the minimum nonzero remediation time, at most 1/2 hour (per defect type)
         """
-        minvals = []
+        time_steps = {}
         for defect_type in self.defect_type_dict.keys():
             temp_list = self.remediation_distributions[defect_type].copy()
             try:
                 min_sample = np.min(temp_list[np.nonzero(temp_list)])
                 if min_sample < 1: # min sample must be less than the defect generation time step = 1 hr
-                    minvals.append(min_sample)
+                    time_steps[defect_type] = min_sample/2
                 else:
-                    minvals.append(1)
+                    time_steps[defect_type] = 1/2
             except ValueError:
-                minvals.append(1)   
-        dt = min(minvals)/2
+                time_steps[defect_type] = 1/2
+        return time_steps
+
+    def compute_time_step(self):
+        """
+        Computes simulation time step from generation and remediation histograms.
+
+        Returns
+            :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
+        """
+        dt = min(self.time_steps().values())
         return dt
     
+    def initialize_samplers(self, seed_sequence):
+        """
+        Sets the samplers drawing from the generation and remediation histograms, each with its own child random stream
+        of the trial (per defect type).
+
+        Args
+            :seed_sequence (Numpy SeedSequence): seeds the random streams of the trial (first trial of the simulation seed if None)
+        Returns
+            :generation_samplers (dict): samplers of the defect incidence rate histograms (per defect type)
+            :remediation_samplers (dict): samplers of the defect remediation time histograms (per defect type)
+        """
+        if seed_sequence is None:
+            seed_sequence = self.trial_seed_sequences(1)[0]
+        keys = list(self.defect_type_dict.keys())
+        generation_root, remediation_root = self.spawn_seed_sequences(seed_sequence, 2)
+        self.generation_samplers = {key: DistributionSampler(self.generation_tables[key], np.random.default_rng(child))
+                                    for key, child in zip(keys, self.spawn_seed_sequences(generation_root, len(keys)))}
+        self.remediation_samplers = {key: DistributionSampler(self.remediation_tables[key], np.random.default_rng(child))
+                                     for key, child in zip(keys, self.spawn_seed_sequences(remediation_root, len(keys)))}
+        return self.generation_samplers, self.remediation_samplers
+
     def load_initial_state(self, initial_state, defect_log, backlog_queue):
         """
         If available, loads the defect log and backlog with the initial state prior to simulation.
 
         Args
             :initial_state (dict): initial state of the defect log prior to simulation
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
         Returns
             :t_start (float): simulation start time
             :t_end (float): simulation end time
-            :defect_log (dict): simulation defect log (adjusted)
-            :backlog_queue (list): heap (priority queue) of backlogged defects (adjusted)
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
+            :in_flight (tuple): rows and processing queues of the defects whose remediation had begun (Numpy arrays)
         """
         t_start = initial_state['t_end']
         t_end = t_start + self.t_end
         defect_log = initial_state['defect_log']
-        for key in defect_log.keys():
-            try:
-                defect_log[key]['processing_end_time'] ### defect in initial_state has been remediated, it does not get added to the backlog_queue
-            except KeyError:
-                ### defect has not been remediated yet, add it to the backlog_queue
-                hq.heappush(backlog_queue, (self.defect_type_dict[defect_log[key]['defect_type']]['priority'], key)) # tuple (priority level, defect ID tag) will be sorted in heap based on priority
-        return t_start, t_end, defect_log, backlog_queue
+        if isinstance(defect_log, dict):
+            ### defect_log exported by a previous version, convert to the columnar store
+            defect_log = DefectStore.from_dict(defect_log, self.defect_type_dict)
+            initial_state['defect_log'] = defect_log
+        defect_log = self.current_priorities(defect_log)
+        ### defects that have not been remediated yet are added to the backlog_queue, unless their remediation had begun
+        open_rows, in_flight_lanes = self.open_defects(initial_state, defect_log)
+        waiting = open_rows[in_flight_lanes < 0]
+        for priority in np.unique(defect_log.priority[waiting]):
+            backlog_queue.push_many(int(priority), waiting[defect_log.priority[waiting] == priority].tolist())
+        in_flight = (open_rows[in_flight_lanes >= 0], in_flight_lanes[in_flight_lanes >= 0]) # back to their processing queue (initialize_queues)
+        return t_start, t_end, defect_log, backlog_queue, in_flight
+
+    def current_priorities(self, defect_log):
+        """
+        Sets the priority of the defects of a loaded state from their defect type and the current defect_type_dict, as
+        the states exported by previous versions are (a changed --defect_priority applies to the carried-over defects).
+
+        Args
+            :defect_log (DefectStore): simulation defect log of the initial state
+        Returns
+            :defect_log (DefectStore): simulation defect log of the initial state (adjusted)
+        """
+        type_priority = np.array([self.defect_type_dict[key]['priority'] for key in defect_log.defect_types])
+        defect_log.priority[:len(defect_log)] = type_priority[defect_log['type_code']]
+        return defect_log
+
+    def open_defects(self, initial_state, defect_log):
+        """
+        Open defects of a loaded state: the explicit open-defect set of a checkpoint (no scan of the closed history),
+        otherwise found by scanning the defect log.
+
+        Args
+            :initial_state (dict): initial state of the defect log prior to simulation
+            :defect_log (DefectStore): simulation defect log of the initial state
+        Returns
+            :open_rows (Numpy array): rows of the defects not remediated yet
+            :in_flight_lanes (Numpy array): processing queue of each open defect whose remediation had begun, -1 otherwise
+        """
+        if 'open_defects' in initial_state:
+            return initial_state['open_defects']
+        open_rows = defect_log.open_rows()
+        return open_rows, defect_log.in_flight_lanes(open_rows)
     
     def initialize_backlog(self, t_start, defect_log, backlog_queue):
         """
@@ -168,49 +291,54 @@ class DefectRemediationSimulator:
 
         Args
             :t_start (float): simulation start time
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
         Returns
-            :defect_log (dict): simulation defect log (adjusted)
-            :backlog_queue (list): heap (priority queue) of backlogged defects (adjusted)
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
         """
         #### INITIALIZATION OF THE BACKLOG ####
-        for key in self.defect_type_dict.keys():
-            for _ in range(self.defect_type_dict[key]['initial']):
-                defect_ID = f'ID_{str(np.random.randint(1, 1000000000))}'
-                remediation_time = np.random.choice(self.remediation_distributions[key], size=1, replace=True)
-                defect_log[defect_ID] = {'defect_type': key, 't_created': t_start, 'remediation_time': remediation_time}
-                hq.heappush(backlog_queue, (self.defect_type_dict[key]['priority'], defect_ID)) # tuple (priority level, defect ID tag) will be sorted in heap based on priority
+        for type_code, key in enumerate(self.defect_type_dict.keys()):
+            remediation_time = self.remediation_samplers[key].sample_many(self.defect_type_dict[key]['initial'])
+            rows = defect_log.extend(type_code, self.defect_type_dict[key]['priority'], t_start, remediation_time) # one block of sequential defect IDs per defect type
+            backlog_queue.push_many(self.defect_type_dict[key]['priority'], rows.tolist())
         return defect_log, backlog_queue
     
-    def initialize_queues(self, t_start, defect_log, backlog_queue):
+    def initialize_queues(self, t_start, defect_log, backlog_queue, in_flight=None):
         """
         If resources allow, initialize remediation queues prior to simulation.
 
         Args
             :t_start (float): simulation start time
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
+            :in_flight (tuple): rows and processing queues of the defects of a loaded state whose remediation had begun
         Returns
-            :queue_dict (dict): stores processing queue information
-            :defect_log (dict): simulation defect log (adjusted)
-            :backlog_queue (list): heap (priority queue) of backlogged defects (adjusted)
+            :lanes (ProcessingLanes): processing queue slots
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
         """
-        queue_dict = {} 
+        lanes = ProcessingLanes(self.resources, self.resources_qmax)
+        #### DEFECTS OF A LOADED STATE WHOSE REMEDIATION HAD BEGUN CONTINUE IN THEIR PROCESSING QUEUE ####
+        if in_flight is not None:
+            for defect, lane in zip(*in_flight):
+                free = lanes.empty_slots(lane) if lane < self.resources else []
+                if len(free) > 0:
+                    lanes.assign(lane, free[0], defect, defect_log.processing_start_time[defect], defect_log.remediation_time[defect])
+                else:
+                    ### fewer resources than when the state was saved, back to the backlog
+                    defect_log.queue_index[defect] = -1
+                    backlog_queue.push_many(int(defect_log.priority[defect]), [int(defect)])
         #### INITALIZATION OF THE REMEDIATION QUEUES ####
-        for n in range(1, self.resources + 1):
-            queue_dict['processing_queue{0}'.format(n)] = queue.Queue(maxsize=self.resources_qmax)
-            for _ in range(self.resources_qmax):
-                with contextlib.suppress(IndexError):
-                    if defect_pull := hq.heappop(backlog_queue)[1]:
-                        queue_dict['processing_queue{0}'.format(n)].put(defect_pull, block=False)
-                        try:
-                            check_var = defect_log[defect_pull]['processing_start_time'] # remediation was already begun in a previous state, continue from where it left off
-                        except KeyError:
-                            # remediation has not started, start it from now
-                            defect_log[defect_pull]['processing_start_time'] = t_start + 0
-                        defect_log[defect_pull]['processing_queue'] = 'processing_queue{0}'.format(n)
-        return queue_dict, defect_log, backlog_queue
+        for lane, slot in zip(*lanes.empty_slots()):
+            with contextlib.suppress(IndexError):
+                defect_pull = backlog_queue.pop()[1]
+                if np.isnan(defect_log.processing_start_time[defect_pull]): # otherwise remediation was already begun in a previous state, continue from where it left off
+                    # remediation has not started, start it from now
+                    defect_log.processing_start_time[defect_pull] = t_start + 0
+                defect_log.queue_index[defect_pull] = lane
+                lanes.assign(lane, slot, defect_pull, defect_log.processing_start_time[defect_pull], defect_log.remediation_time[defect_pull])
+        return lanes, defect_log, backlog_queue
     
     def incoming_defects(self, t, incoming_defects_tracker, incoming_defects_stored, defect_log, backlog_queue):
         """
@@ -220,104 +348,145 @@ class DefectRemediationSimulator:
             :t (float): current simulation time
             :incoming_defects_tracker (dict): intermediary for tracking the incoming defects, stores samples from generation distributions (per defect type)
             :incoming_defects_stored (dict): tracks the incoming defects generated throughout the simulation (per defect type)
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
         Returns
             :incoming_defects_tracker (dict): intermediary for tracking the incoming defects, stores samples from generation distributions (per defect type) (adjusted)
             :incoming_defects_stored (dict): tracks the incoming defects generated throughout the simulation (per defect type) (adjusted)
-            :defect_log (dict): simulation defect log (adjusted)
-            :backlog_queue (list): heap (priority queue) of backlogged defects (adjusted)
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
         """
-        for key in incoming_defects_tracker.keys():
+        for type_code, key in enumerate(incoming_defects_tracker.keys()):
             incoming_defects_stored[key].append(incoming_defects_tracker[key][0])
-            defect_ID = [f'ID_{str(np.random.randint(1, 1000000000))}' for _ in range(int(incoming_defects_tracker[key][0]))] ### one defect ID per defect that came in in that hour
-            priority_level = [self.defect_type_dict[key]['priority'] for _ in range(int(incoming_defects_tracker[key][0]))]
-            remediation_time = [np.random.choice(self.remediation_distributions[key], size=1, replace=True) for _ in range(int(incoming_defects_tracker[key][0]))]
-            defect_log.update({defect_ID[i]: {'defect_type': key, 't_created': t, 'remediation_time': remediation_time[i]} for i in range(int(incoming_defects_tracker[key][0]))})
-            backlog_queue = backlog_queue + list(zip(priority_level, defect_ID))
-            hq.heapify(backlog_queue)
-            incoming_defects_tracker[key] = np.random.choice(self.generation_distributions[key], size=1, replace=True) ### reinitialize the incoming_defects_tracker
+            remediation_time = self.remediation_samplers[key].sample_many(int(incoming_defects_tracker[key][0]))
+            rows = defect_log.extend(type_code, self.defect_type_dict[key]['priority'], t, remediation_time) ### one block of sequential defect IDs for the defects that came in in that hour
+            backlog_queue.push_many(self.defect_type_dict[key]['priority'], rows.tolist())
+            incoming_defects_tracker[key] = self.generation_samplers[key].sample_many(1) ### reinitialize the incoming_defects_tracker
         return incoming_defects_tracker, incoming_defects_stored, defect_log, backlog_queue
     
-    def check_queues(self, n, t, queue_dict, defect_log, backlog_queue):
+    def check_queues(self, t, lanes, defect_log, backlog_queue):
         """
-        Check for empty slot in remediation queues, fill slot if found.
+        Check for empty slots in remediation queues, fill slots if found.
 
         Args
-            :n (int): processing queue number
             :t (float): current simulation time
-            :queue_dict (dict): stores processing queue information
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :lanes (ProcessingLanes): processing queue slots
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
         Returns
-            :queue_dict (dict): stores processing queue information
-            :defect_log (dict): simulation defect log (adjusted)
-            :backlog_queue (list): heap (priority queue) of backlogged defects (adjusted)
+            :lanes (ProcessingLanes): processing queue slots (adjusted)
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
         """
-        if queue_dict['processing_queue{0}'.format(n)].qsize() < self.resources_qmax:
-            for _ in range(self.resources_qmax - queue_dict['processing_queue{0}'.format(n)].qsize()):
-                with contextlib.suppress(IndexError):
-                    if defect_pull := hq.heappop(backlog_queue)[1]:
-                        queue_dict['processing_queue{0}'.format(n)].put(defect_pull, block=False)
-                        defect_log[defect_pull]['processing_start_time'] = t
-                        defect_log[defect_pull]['processing_queue'] = 'processing_queue{0}'.format(n)
-        return queue_dict, defect_log, backlog_queue 
+        if len(backlog_queue) == 0:
+            return lanes, defect_log, backlog_queue
+        for lane, slot in zip(*lanes.empty_slots()):
+            with contextlib.suppress(IndexError):
+                defect_pull = backlog_queue.pop()[1]
+                defect_log.processing_start_time[defect_pull] = t
+                defect_log.queue_index[defect_pull] = lane
+                lanes.assign(lane, slot, defect_pull, t, defect_log.remediation_time[defect_pull])
+        return lanes, defect_log, backlog_queue
 
-    def check_remediation(self, n, t, queue_dict, defect_log, backlog_queue):
+    def check_remediation(self, t, lanes, defect_log, backlog_queue):
         """
         Check for remediated defects in remediation queues, remove from queue if found and fill slot with new defect to treat.
 
         Args
-            :n (int): processing queue number
             :t (float): current simulation time
-            :queue_dict (dict): stores processing queue information
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :lanes (ProcessingLanes): processing queue slots
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
         Returns
-            :queue_dict (dict): stores processing queue information
-            :defect_log (dict): simulation defect log (adjusted)
-            :backlog_queue (list): heap (priority queue) of backlogged defects (adjusted)
-        """
-        for _ in range(self.resources_qmax):
-            with contextlib.suppress(queue.Empty):
-                if processing_defect := queue_dict['processing_queue{0}'.format(n)].get(block=False): #####
-                    if (t - defect_log[processing_defect]['processing_start_time'] >= defect_log[processing_defect]['remediation_time']) and (defect_log[processing_defect]['remediation_time'] != 0):
-                        ### defect has been remediated, updated processing_end_time + pick a new defect from the backlog queue to treat
-                        leftover_outgoing = (t - defect_log[processing_defect]['processing_start_time']) - defect_log[processing_defect]['remediation_time']
-                        defect_log[processing_defect]['processing_end_time'] = t - leftover_outgoing
-                        with contextlib.suppress(IndexError):
-                            if defect_pull := hq.heappop(backlog_queue)[1]:
-                                queue_dict['processing_queue{0}'.format(n)].put(defect_pull, block=False)
-                                defect_log[defect_pull]['processing_start_time'] = t - leftover_outgoing
-                                defect_log[defect_pull]['processing_queue'] = 'processing_queue{0}'.format(n)
-                    else:
-                        ### defect has not finished being remediated, put the processing_defect back into the queue
-                        queue_dict['processing_queue{0}'.format(n)].put(processing_defect, block=False)
-        return queue_dict, defect_log, backlog_queue
-
-
-
-    def simulate_defect_backlog(self, dt, initial_state):
+            :lanes (ProcessingLanes): processing queue slots (adjusted)
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
+        """
+        for lane, slot in zip(*lanes.completed_slots(t)):
+            ### defect has been remediated, updated processing_end_time + pick a new defect from the backlog queue to treat
+            t_done = lanes.due[lane, slot]
+            defect_log.processing_end_time[lanes.release(lane, slot)] = t_done
+            with contextlib.suppress(IndexError):
+                defect_pull = backlog_queue.pop()[1]
+                defect_log.processing_start_time[defect_pull] = t_done
+                defect_log.queue_index[defect_pull] = lane
+                lanes.assign(lane, slot, defect_pull, t_done, defect_log.remediation_time[defect_pull])
+        return lanes, defect_log, backlog_queue
+
+    def fill_queue(self, lane, t, lanes, defect_log, backlog_queue, completion_heap):
+        """
+        Event-driven counterpart of check_queues, fill the empty slots of one processing queue and schedule their completions.
+
+        Args
+            :lane (int): processing queue index
+            :t (float): current simulation time
+            :lanes (ProcessingLanes): processing queue slots
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
+            :completion_heap (list): heap of (completion time, processing queue index, slot index)
+        Returns
+            :lanes (ProcessingLanes): processing queue slots (adjusted)
+            :defect_log (DefectStore): simulation defect log (adjusted)
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects (adjusted)
+            :completion_heap (list): heap of (completion time, processing queue index, slot index) (adjusted)
+        """
+        for slot in lanes.empty_slots(lane):
+            with contextlib.suppress(IndexError):
+                defect_pull = backlog_queue.pop()[1]
+                defect_log.processing_start_time[defect_pull] = t
+                defect_log.queue_index[defect_pull] = lane
+                t_done = lanes.assign(lane, slot, defect_pull, t, defect_log.remediation_time[defect_pull])
+                if t_done != np.inf:
+                    hq.heappush(completion_heap, (t_done, lane, slot))
+        return lanes, defect_log, backlog_queue, completion_heap
+
+    def adaptive_steps(self, t_start, t_end, lanes):
+        """
+        Time steps of the adaptive mode: each step jumps to the next "on the hour" arrival or to the earliest pending
+        remediation completion, whichever comes first. No completion is noticed late, and the number of steps follows the
+        number of events rather than t_end/dt, whatever the shortest remediation time.
+
+        Args
+            :t_start (float): simulation start time
+            :t_end (float): simulation end time
+            :lanes (ProcessingLanes): processing queue slots, read again after each step
+        Returns
+            :steps (generator): simulation times, from t_start to the last hour
+        """
+        hours = np.arange(t_start+1, t_end+1)
+        if len(hours) == 0:
+            return
+        yield t_start
+        for hour in hours:
+            while lanes.due.min() < hour:
+                yield lanes.due.min()
+            yield hour # completions due on the hour are handled with the arrivals
+
+    def simulate_defect_backlog(self, dt, initial_state, seed_sequence=None, adaptive=False):
         """
         The main defect backlog simulation pipeline.
 
         Args
             :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
             :initial_state (dict): initial state of the defect log prior to simulation
+            :seed_sequence (Numpy SeedSequence): seeds the random streams of the trial (first trial of the simulation seed if None)
+            :adaptive (bool): if stepping from one arrival or earliest pending completion to the next instead of every dt (see adaptive_steps)
         Returns
             :np.array(times) (Numpy array): time steps governing backlog simulation
             :incoming_defects_stored (dict): tracks the incoming defects generated throughout the simulation (per defect type)
-            :defect_log (dict): simulation defect log
-            :backlog_queue (list): heap (priority queue) of backlogged defects
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
         """
+        self.initialize_samplers(seed_sequence)
         t_start = 0 # assume that starting time of the simulation is now to initialize
         t_end = self.t_end
-        defect_log = {}
-        backlog_queue = []
+        defect_log = DefectStore(self.defect_type_dict.keys(), id_prefix=self.id_prefix)
+        backlog_queue = BacklogQueue()
+        in_flight = None
 
         #### IF AVAILABLE, LOAD IN INITIAL STATE ####
         if initial_state:
-            t_start, t_end, defect_log, backlog_queue = self.load_initial_state(initial_state, defect_log, backlog_queue)
+            t_start, t_end, defect_log, backlog_queue, in_flight = self.load_initial_state(initial_state, defect_log, backlog_queue)
             
         times1 = np.arange(t_start, t_end, dt) # time step array
         times2 = np.arange(t_start+1, t_end+1) # "on the hour" array (for defect generation)
@@ -326,16 +495,18 @@ class DefectRemediationSimulator:
         
         #### INITIALIZATION OF THE BACKLOG + REMEDIATION PROCESSING QUEUES ####
         defect_log, backlog_queue = self.initialize_backlog(t_start, defect_log, backlog_queue)
-        queue_dict, defect_log, backlog_queue = self.initialize_queues(t_start, defect_log, backlog_queue)
+        lanes, defect_log, backlog_queue = self.initialize_queues(t_start, defect_log, backlog_queue, in_flight)
 
         #### INITIALIZATION OF INCOMING DEFECT TRACKER ####
-        incoming_defects_tracker = {key: np.random.choice(self.generation_distributions[key], size=1, replace=True) for key in self.defect_type_dict.keys()}
+        incoming_defects_tracker = {key: self.generation_samplers[key].sample_many(1) for key in self.defect_type_dict.keys()}
         incoming_defects_stored = {key: [] for key in self.defect_type_dict.keys()}
         hour = t_start + 1.0
+        steps = self.adaptive_steps(t_start, t_end, lanes) if adaptive else times
+        times = []
 
         
         #### LOOP OVER TIME ####
-        for t in times:
+        for t in steps:
             #### INCOMING "ON THE HOUR" DEFECTS ####
             if t == hour:
                 incoming_defects_tracker, incoming_defects_stored, defect_log, backlog_queue = self.incoming_defects(t, 
@@ -346,10 +517,221 @@ class DefectRemediationSimulator:
                 hour += 1            
             
             #### UPDATE REMEDIATION ####
-            for n in range(1, self.resources + 1):
-                ### first check if processing_queue{n} is empty or not filled to resources_qmax
-                queue_dict, defect_log, backlog_queue = self.check_queues(n, t, queue_dict, defect_log, backlog_queue)
-                ### next check if each defect in processing_queue{n} has been remediated at time t
-                queue_dict, defect_log, backlog_queue = self.check_remediation(n, t, queue_dict, defect_log, backlog_queue)
+            ### first check if any processing queue is empty or not filled to resources_qmax
+            lanes, defect_log, backlog_queue = self.check_queues(t, lanes, defect_log, backlog_queue)
+            ### next check which defects in the processing queues have been remediated at time t
+            lanes, defect_log, backlog_queue = self.check_remediation(t, lanes, defect_log, backlog_queue)
+            times.append(t)
+
+        return np.array(times), incoming_defects_stored, defect_log, backlog_queue
+
+    def simulate_defect_backlog_events(self, initial_state, seed_sequence=None):
+        """
+        Event-driven defect backlog simulation pipeline. Instead of stepping through a fixed time step, the simulation
+        jumps straight to the next "on the hour" arrival or remediation completion (single completion-time heap), so its
+        cost scales with the number of events rather than with t_end/dt.
+
+        Args
+            :initial_state (dict): initial state of the defect log prior to simulation
+            :seed_sequence (Numpy SeedSequence): seeds the random streams of the trial (first trial of the simulation seed if None)
+        Returns
+            :np.array(times) (Numpy array): event times processed during the backlog simulation
+            :incoming_defects_stored (dict): tracks the incoming defects generated throughout the simulation (per defect type)
+            :defect_log (DefectStore): simulation defect log
+            :backlog_queue (BacklogQueue): priority queue of backlogged defects
+        """
+        self.initialize_samplers(seed_sequence)
+        t_start = 0 # assume that starting time of the simulation is now to initialize
+        t_end = self.t_end
+        defect_log = DefectStore(self.defect_type_dict.keys(), id_prefix=self.id_prefix)
+        backlog_queue = BacklogQueue()
+        in_flight = None
+
+        #### IF AVAILABLE, LOAD IN INITIAL STATE ####
+        if initial_state:
+            t_start, t_end, defect_log, backlog_queue, in_flight = self.load_initial_state(initial_state, defect_log, backlog_queue)
+
+        hours = np.arange(t_start+1, t_end+1) # "on the hour" array (for defect generation), the last hour is the simulation horizon
+
+        #### INITIALIZATION OF THE BACKLOG + REMEDIATION PROCESSING QUEUES ####
+        defect_log, backlog_queue = self.initialize_backlog(t_start, defect_log, backlog_queue)
+        lanes, defect_log, backlog_queue = self.initialize_queues(t_start, defect_log, backlog_queue, in_flight)
+
+        #### INITIALIZATION OF THE COMPLETION HEAP ####
+        completion_heap = [(lanes.due[lane, slot], lane, slot) for lane, slot in zip(*np.nonzero(np.isfinite(lanes.due)))]
+        hq.heapify(completion_heap)
+
+        #### INITIALIZATION OF INCOMING DEFECT TRACKER ####
+        incoming_defects_tracker = {key: self.generation_samplers[key].sample_many(1) for key in self.defect_type_dict.keys()}
+        incoming_defects_stored = {key: [] for key in self.defect_type_dict.keys()}
+
+        #### LOOP OVER EVENTS ####
+        times = []
+        hour_index = 0
+        while True:
+            next_hour = hours[hour_index] if hour_index < len(hours) else np.inf
+            next_completion = completion_heap[0][0] if completion_heap else np.inf
+            if next_completion < next_hour and len(hours) > 0 and next_completion <= hours[-1]:
+                #### REMEDIATION COMPLETED ####
+                t, lane, slot = hq.heappop(completion_heap)
+                defect_log.processing_end_time[lanes.release(lane, slot)] = t
+                ### pick a new defect from the backlog queue to treat, starting when the previous one ended
+                lanes, defect_log, backlog_queue, completion_heap = self.fill_queue(lane,
+                                                                                    t,
+                                                                                    lanes,
+                                                                                    defect_log,
+                                                                                    backlog_queue,
+                                                                                    completion_heap)
+            elif next_hour != np.inf:
+                #### INCOMING "ON THE HOUR" DEFECTS ####
+                t = next_hour
+                incoming_defects_tracker, incoming_defects_stored, defect_log, backlog_queue = self.incoming_defects(t,
+                                                                                                                     incoming_defects_tracker,
+                                                                                                                     incoming_defects_stored,
+                                                                                                                     defect_log,
+                                                                                                                     backlog_queue)
+                for lane in range(self.resources):
+                    lanes, defect_log, backlog_queue, completion_heap = self.fill_queue(lane, t, lanes, defect_log, backlog_queue, completion_heap)
+                hour_index += 1
+            else:
+                break
+            times.append(t)
+
+        return np.array(times), incoming_defects_stored, defect_log, backlog_queue
+
+    def simulate_defect_backlog_batch(self, initial_states, seed_sequences=None):
+        """
+        Vectorized defect backlog simulation pipeline, advances all the Monte Carlo trials at once. Arrivals and
+        remediation times are drawn up front for every trial, then processing slots are filled in lockstep: at each
+        step, every trial hands its earliest free slot the highest priority defect available at that time, using
+        trial-indexed Numpy arrays for the backlog (per priority level), the processing slots and the remediation times.
+
+        Args
+            :initial_states (list): initial state of the defect log prior to simulation (per trial, empty dict if none)
+            :seed_sequences (list): seeds the random streams of each trial, Numpy SeedSequence (trial_seed_sequences if None)
+        Returns
+            :times (list): "on the hour" time steps governing backlog simulation (per trial)
+            :incoming_defects_stored (list): tracks the incoming defects generated throughout the simulation (per trial, per defect type)
+            :defect_logs (list): simulation defect log, DefectStore (per trial)
+            :backlog_queues (list): priority queue of backlogged defects, BacklogQueue (per trial)
+        """
+        trials = len(initial_states)
+        if seed_sequences is None:
+            seed_sequences = self.trial_seed_sequences(trials)
+        samplers = [self.initialize_samplers(seed_sequence) for seed_sequence in seed_sequences] # same random streams as the trial run on its own
+        defect_types = list(self.defect_type_dict.keys())
+        priorities = np.unique([self.defect_type_dict[key]['priority'] for key in defect_types])
+        slots = self.resources * self.resources_qmax
+
+        #### SIMULATION HORIZON (PER TRIAL) ####
+        t_start = np.array([initial_state['t_end'] if initial_state else 0 for initial_state in initial_states], dtype=float)
+        n_hours = len(np.arange(1, self.t_end + 1))
+        hours = t_start[:, None] + np.arange(1, n_hours + 1) # "on the hour" array (for defect generation)
+        horizon = hours[:, -1] if n_hours > 0 else np.full(trials, -np.inf) # no simulation when t_end = 0
+
+        #### PROCESSING SLOTS ####
+        free_time = np.repeat(t_start[:, None], slots, axis=1)
+        held = np.zeros((trials, slots), dtype=bool) # slots held by the defects of a loaded state whose remediation had begun
+
+        #### DEFECTS TO SCHEDULE: LOADED BACKLOG, INITIAL BACKLOG AND INCOMING DEFECTS (ONE DEFECT STORE PER TRIAL) ####
+        incoming_counts = {key: np.array([generation_samplers[key].sample_many(n_hours) for generation_samplers, _ in samplers]).reshape(trials, n_hours) for key in defect_types}
+        defect_logs, trial_index, row_index = [], [], []
+        for i, initial_state in enumerate(initial_states):
+            defect_log = initial_state['defect_log'] if initial_state else DefectStore(defect_types, id_prefix=self.id_prefix)
+            if isinstance(defect_log, dict):
+                ### defect_log exported by a previous version, convert to the columnar store
+                defect_log = DefectStore.from_dict(defect_log, self.defect_type_dict)
+                initial_state['defect_log'] = defect_log
+            if initial_state:
+                defect_log = self.current_priorities(defect_log)
+            open_rows, in_flight_lanes = self.open_defects(initial_state, defect_log) if initial_state else (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+            waiting = [open_rows[in_flight_lanes < 0]] # defects in initial_state that have not been remediated yet go back to the backlog
+            for defect, lane in zip(open_rows[in_flight_lanes >= 0], in_flight_lanes[in_flight_lanes >= 0]):
+                ### unless their remediation had begun, then they continue in their processing queue until done
+                free = np.flatnonzero(~held[i, lane*self.resources_qmax:(lane+1)*self.resources_qmax]) if lane < self.resources else []
+                if len(free) == 0:
+                    ### fewer resources than when the state was saved, back to the backlog
+                    defect_log.queue_index[defect] = -1
+                    waiting.append([defect])
+                    continue
+                slot = lane * self.resources_qmax + free[0]
+                held[i, slot] = True
+                t_done = defect_log.processing_start_time[defect] + defect_log.remediation_time[defect]
+                if defect_log.remediation_time[defect] == 0:
+                    free_time[i, slot] = np.inf # a zero remediation time never completes
+                else:
+                    free_time[i, slot] = max(t_done, t_start[i])
+                    if t_done <= horizon[i]:
+                        defect_log.processing_end_time[defect] = t_done
+            rows = [np.concatenate(waiting).astype(np.int64)]
+            for type_code, key in enumerate(defect_types):
+                created = np.concatenate((np.full(self.defect_type_dict[key]['initial'], t_start[i]),
+                                          np.repeat(hours[i], incoming_counts[key][i].astype(int))))
+                rows.append(defect_log.extend(type_code,
+                                              self.defect_type_dict[key]['priority'],
+                                              created,
+                                              samplers[i][1][key].sample_many(len(created))))
+            rows = np.concatenate(rows)
+            defect_logs.append(defect_log)
+            trial_index.append(np.full(len(rows), i))
+            row_index.append(rows)
+        trial_index = np.concatenate(trial_index)
+        t_created = np.concatenate([defect_logs[i].t_created[rows] for i, rows in enumerate(row_index)])
+        remediation_time = np.concatenate([defect_logs[i].remediation_time[rows] for i, rows in enumerate(row_index)])
+        prior_start = np.concatenate([defect_logs[i].processing_start_time[rows] for i, rows in enumerate(row_index)]) # remediation already begun in a previous state
+        type_index = np.concatenate([defect_logs[i].type_code[rows] for i, rows in enumerate(row_index)])
+        priority_index = np.searchsorted(priorities, np.array([self.defect_type_dict[key]['priority'] for key in defect_types])[type_index])
+        assert (priority_index < len(priorities)).all() # otherwise a group would fall into the next trial's range
+
+        #### BACKLOG: ONE FIFO PER (TRIAL, PRIORITY LEVEL), AS POINTERS INTO THE SORTED DEFECTS ####
+        n_defects = len(t_created)
+        order = np.lexsort((np.arange(n_defects), t_created, priority_index, trial_index))
+        group = (trial_index * len(priorities) + priority_index)[order]
+        pointer = np.searchsorted(group, np.arange(trials * len(priorities)), side='left').reshape(trials, len(priorities))
+        pointer_end = np.searchsorted(group, np.arange(trials * len(priorities)), side='right').reshape(trials, len(priorities))
+        created_sorted = np.append(t_created[order], np.inf) # sentinel for exhausted priority levels
+
+        #### ASSIGNMENTS ####
+        processing_start = np.full(n_defects, np.nan)
+        processing_end = np.full(n_defects, np.nan)
+        processing_slot = np.full(n_defects, -1)
+
+        #### LOOP OVER ASSIGNMENTS, ONE DEFECT PER TRIAL AT EACH STEP ####
+        rows = np.arange(trials)
+        active = np.ones(trials, dtype=bool)
+        while active.any():
+            slot = np.argmin(free_time, axis=1)
+            head_time = created_sorted[np.where(pointer < pointer_end, pointer, n_defects)]
+            t_assign = np.maximum(free_time[rows, slot], head_time.min(axis=1)) # wait for the next arrival if the backlog is empty
+            active &= t_assign <= horizon
+            choice = np.argmax(head_time <= t_assign[:, None], axis=1) # highest priority level available at t_assign
+            r = rows[active]
+            defect = order[pointer[r, choice[r]]]
+            pointer[r, choice[r]] += 1
+            ### remediation already begun in a previous state continues from where it left off
+            start = np.where(np.isnan(prior_start[defect]), t_assign[r], prior_start[defect])
+            t_done = start + remediation_time[defect]
+            processing_start[defect] = start
+            processing_slot[defect] = slot[r]
+            remediated = (remediation_time[defect] != 0) & (t_done <= horizon[r]) # a zero remediation time never completes
+            processing_end[defect[remediated]] = t_done[remediated]
+            free_time[r, slot[r]] = np.where(remediation_time[defect] != 0, np.maximum(t_done, t_assign[r]), np.inf)
+
+        #### WRITE BACK TO THE DEFECT LOGS (PER TRIAL) ####
+        backlog_queues = []
+        bounds = np.cumsum([0] + [len(rows) for rows in row_index])
+        for i, defect_log in enumerate(defect_logs):
+            rows = row_index[i]
+            start, end, slot = processing_start[bounds[i]:bounds[i+1]], processing_end[bounds[i]:bounds[i+1]], processing_slot[bounds[i]:bounds[i+1]]
+            assigned = slot >= 0
+            defect_log.processing_start_time[rows[assigned]] = start[assigned]
+            defect_log.queue_index[rows[assigned]] = slot[assigned] // self.resources_qmax
+            defect_log.processing_end_time[rows] = end
+            backlog_queue = BacklogQueue()
+            for index, priority in enumerate(priorities):
+                backlog_queue.push_many(int(priority), rows[~assigned & (priority_index[bounds[i]:bounds[i+1]] == index)].tolist())
+            backlog_queues.append(backlog_queue)
 
-        return np.array(times), incoming_defects_stored, defect_log, backlog_queue
\ No newline at end of file
+        incoming_defects_stored = [{key: incoming_counts[key][i].tolist() for key in defect_types} for i in range(trials)]
+        times = [hours[i] for i in range(trials)]
+        return times, incoming_defects_stored, defect_logs, backlog_queues
@@ -0,0 +1,223 @@
+import numpy as np
+
+
+class DefectStore:
+    """
+    Columnar (structure-of-arrays) defect log. Each defect is a row of typed arrays, indexed by its integer row number,
+    and the arrays grow by amortized doubling. Defect IDs are handed out sequentially (in blocks) by the store itself,
+    so they never collide and keep increasing across continuations of the same trial. A store resumed from a checkpoint
+    whose closed history was moved to cold storage only holds the defects still open at history_end and those after
+    it, the others being in the cold_segments files.
+    """
+    columns = ('defect_id', 'type_code', 'priority', 't_created', 'remediation_time', 'processing_start_time', 'processing_end_time', 'queue_index')
+    dtypes = (np.int64, np.int16, np.int32, np.float64, np.float64, np.float64, np.float64, np.int32)
+    fill_values = {'processing_start_time': np.nan,  # NaN = remediation not started
+                   'processing_end_time': np.nan,    # NaN = not remediated
+                   'queue_index': -1}                # -1 = not assigned to a processing queue
+    cold_segments = ()  # Arrow IPC files of the closed history moved to cold storage
+    history_end = 0.0   # time up to which the closed history is in cold_segments
+
+    def __init__(self, defect_types, capacity=1024, id_prefix='ID'):
+        self.defect_types = list(defect_types)
+        self.id_prefix = id_prefix
+        self.next_id = 1
+        self.size = 0
+        for column, dtype in zip(self.columns, self.dtypes):
+            setattr(self, column, np.full(capacity, self.fill_values.get(column, 0), dtype=dtype))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, column):
+        """
+        Returns a view of a column, trimmed to the defects stored.
+        """
+        if column not in self.columns:
+            raise KeyError(f"{column}: Must be one of {self.columns}")
+        return getattr(self, column)[:self.size]
+
+    def __getstate__(self):
+        ### pickle only the defects stored, not the spare capacity
+        state = self.__dict__.copy()
+        for column in self.columns:
+            state[column] = state[column][:self.size].copy()
+        return state
+
+    def reserve(self, capacity):
+        """
+        Grows the columns to at least capacity rows, doubling the current capacity.
+
+        Args
+            :capacity (int): minimum number of rows
+        """
+        current = len(self.defect_id)
+        if capacity <= current:
+            return
+        new_capacity = max(capacity, 2 * current)
+        for column, dtype in zip(self.columns, self.dtypes):
+            new = np.full(new_capacity, self.fill_values.get(column, 0), dtype=dtype)
+            new[:self.size] = getattr(self, column)[:self.size]
+            setattr(self, column, new)
+
+    def allocate_ids(self, n):
+        """
+        Hands out a block of n sequential defect IDs.
+
+        Args
+            :n (int): number of defect IDs
+        Returns
+            :defect_ids (Numpy array): block of defect IDs
+        """
+        defect_ids = np.arange(self.next_id, self.next_id + n, dtype=np.int64)
+        self.next_id += n
+        return defect_ids
+
+    def append(self, type_code, priority, t_created, remediation_time, defect_id=None):
+        """
+        Adds a single defect to the store.
+
+        Args
+            :type_code (int): index of the defect type in defect_types
+            :priority (int): priority level of the defect type
+            :t_created (float): time of creation
+            :remediation_time (float): time needed to remediate the defect
+            :defect_id (int): defect ID (next sequential ID if None)
+        Returns
+            :row (int): row of the defect in the store
+        """
+        return self.extend(type_code, priority, t_created, [remediation_time], None if defect_id is None else [defect_id])[0]
+
+    def extend(self, type_code, priority, t_created, remediation_times, defect_ids=None):
+        """
+        Adds a block of defects to the store.
+
+        Args
+            :type_code (int or array-like): index of the defect type in defect_types
+            :priority (int or array-like): priority level of the defect type
+            :t_created (float or array-like): time of creation
+            :remediation_times (array-like): time needed to remediate each defect
+            :defect_ids (array-like): defect IDs (block of sequential IDs if None)
+        Returns
+            :rows (Numpy array): rows of the defects in the store
+        """
+        n = len(remediation_times)
+        if defect_ids is None:
+            defect_ids = self.allocate_ids(n)
+        else:
+            self.next_id = max(self.next_id, int(np.max(defect_ids, initial=0)) + 1) # keep the sequential IDs clear of the ones given
+        self.reserve(self.size + n)
+        rows = np.arange(self.size, self.size + n)
+        self.defect_id[rows] = defect_ids
+        self.type_code[rows] = type_code
+        self.priority[rows] = priority
+        self.t_created[rows] = t_created
+        self.remediation_time[rows] = remediation_times
+        self.size += n
+        return rows
+
+    def open_rows(self):
+        """
+        Returns the rows of the defects that have not been remediated yet.
+        """
+        return np.flatnonzero(np.isnan(self['processing_end_time']))
+
+    def in_flight_lanes(self, rows):
+        """
+        Returns the processing queue of each of the given open defects if its remediation has begun, -1 otherwise.
+        """
+        started = ~np.isnan(self.processing_start_time[rows]) & (self.queue_index[rows] >= 0)
+        return np.where(started, self.queue_index[rows], -1)
+
+    def select(self, rows):
+        """
+        Returns a new store holding only the given rows, in that order.
+        """
+        return DefectStore.from_columns(self.defect_types, {column: self[column][rows] for column in self.columns}, self.id_prefix, self.next_id)
+
+    def to_dict(self):
+        """
+        Dict-of-dicts view of the store, in the defect_log format of previous versions (keys '<id_prefix>_<defect_id>').
+
+        Returns
+            :defect_log (dict): simulation defect log
+        """
+        defect_log = {}
+        for row in range(self.size):
+            entry = {'defect_type': self.defect_types[self.type_code[row]],
+                     't_created': self.t_created[row],
+                     'remediation_time': self.remediation_time[row:row+1]}
+            if not np.isnan(self.processing_start_time[row]):
+                entry['processing_start_time'] = self.processing_start_time[row]
+            if self.queue_index[row] >= 0:
+                entry['processing_queue'] = 'processing_queue{0}'.format(self.queue_index[row] + 1)
+            if not np.isnan(self.processing_end_time[row]):
+                entry['processing_end_time'] = self.processing_end_time[row:row+1]
+            defect_log[f'{self.id_prefix}_{self.defect_id[row]}'] = entry
+        return defect_log
+
+    def to_polars(self):
+        """
+        Polars DataFrame view of the store, one row per defect (null where not started / remediated / assigned).
+
+        Returns
+            :defect_df (Polars DataFrame): simulation defect log
+        """
+        import polars as pl
+        return pl.DataFrame({'defect_id': self['defect_id'],
+                             'defect_type': pl.Series(self['type_code']).replace_strict(list(range(len(self.defect_types))), self.defect_types, return_dtype=pl.String),
+                             'priority': self['priority'],
+                             't_created': self['t_created'],
+                             'remediation_time': self['remediation_time'],
+                             'processing_start_time': self['processing_start_time'],
+                             'processing_end_time': self['processing_end_time'],
+                             'queue_index': self['queue_index']}).with_columns(pl.col('processing_start_time', 'processing_end_time').fill_nan(None),
+                                                                              pl.col('queue_index').replace(-1, None))
+
+    @classmethod
+    def from_columns(cls, defect_types, columns, id_prefix='ID', next_id=1):
+        """
+        Builds a store from its columns, e.g. read back from a checkpoint (the columns are copied into growable arrays).
+
+        Args
+            :defect_types (list): defect types, indexed by type_code
+            :columns (dict): one array per column of DefectStore.columns, same length
+            :id_prefix (str): prefix of the defect IDs
+            :next_id (int): next sequential defect ID
+        Returns
+            :store (DefectStore): columnar defect log
+        """
+        size = len(columns['defect_id'])
+        store = cls(defect_types, capacity=max(size, 1), id_prefix=id_prefix)
+        for column, dtype in zip(cls.columns, cls.dtypes):
+            getattr(store, column)[:size] = np.asarray(columns[column], dtype=dtype)
+        store.size = size
+        store.next_id = max(int(next_id), int(np.max(store['defect_id'], initial=0)) + 1)
+        return store
+
+    @classmethod
+    def from_dict(cls, defect_log, defect_type_dict):
+        """
+        Builds a store from a defect_log in the dict-of-dicts format of previous versions.
+
+        Args
+            :defect_log (dict): simulation defect log
+            :defect_type_dict (dict): maps defect types to corresponing poisson rates, skewness and initial_backlogs
+        Returns
+            :store (DefectStore): columnar defect log
+        """
+        defect_types = list(defect_type_dict.keys())
+        store = cls(defect_types, capacity=max(len(defect_log), 1))
+        for key, entry in defect_log.items():
+            store.id_prefix, defect_id = key.rsplit('_', 1)
+            row = store.append(defect_types.index(entry['defect_type']),
+                               defect_type_dict[entry['defect_type']]['priority'],
+                               entry['t_created'],
+                               np.ravel(entry['remediation_time'])[0],
+                               int(defect_id))
+            if 'processing_start_time' in entry:
+                store.processing_start_time[row] = np.ravel(entry['processing_start_time'])[0]
+            if 'processing_queue' in entry:
+                store.queue_index[row] = int(entry['processing_queue'].removeprefix('processing_queue')) - 1
+            if 'processing_end_time' in entry:
+                store.processing_end_time[row] = np.ravel(entry['processing_end_time'])[0]
+        return store
@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class AliasTable:
+    """
+    Alias table (Vose) of a discrete empirical distribution, e.g. the number of incoming defects per hour: its distinct
+    values with one probability and one alias each, so a draw costs one random column and one uniform, whatever the
+    number of samples the distribution was built from.
+    """
+    def __init__(self, values, probability, alias):
+        self.values = values
+        self.probability = probability
+        self.alias = alias
+
+    @classmethod
+    def from_samples(cls, samples):
+        """
+        Builds the alias table of the empirical distribution of samples.
+
+        Args
+            :samples (array-like): samples of the distribution
+        Returns
+            :table (AliasTable): alias table
+        """
+        values, counts = np.unique(np.asarray(samples, dtype=float), return_counts=True)
+        scaled = counts * len(values) / counts.sum()
+        probability = np.ones(len(values))
+        alias = np.arange(len(values))
+        small = [index for index in range(len(values)) if scaled[index] < 1]
+        large = [index for index in range(len(values)) if scaled[index] >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less] # the rest of the column goes to the larger value
+            (small if scaled[more] < 1 else large).append(more)
+        return cls(values, probability, alias)
+
+    def sample(self, rng, size):
+        """
+        Draws samples from the distribution.
+
+        Args
+            :rng (Numpy Generator): random stream
+            :size (int): number of samples
+        Returns
+            :samples (Numpy array): samples from the distribution
+        """
+        column = rng.integers(0, len(self.values), size=size)
+        return self.values[np.where(rng.random(size) < self.probability[column], column, self.alias[column])]
+
+
+class InverseCDF:
+    """
+    Inverse CDF of a continuous empirical distribution, e.g. remediation times, as its sorted samples: a uniform draw u
+    maps to the sample of rank floor(u * n).
+    """
+    def __init__(self, sorted_samples):
+        self.sorted_samples = sorted_samples
+
+    @classmethod
+    def from_samples(cls, samples):
+        """
+        Builds the inverse CDF of the empirical distribution of samples.
+
+        Args
+            :samples (array-like): samples of the distribution
+        Returns
+            :table (InverseCDF): inverse CDF
+        """
+        return cls(np.sort(np.asarray(samples, dtype=float)))
+
+    def sample(self, rng, size):
+        """
+        Draws samples from the distribution.
+
+        Args
+            :rng (Numpy Generator): random stream
+            :size (int): number of samples
+        Returns
+            :samples (Numpy array): samples from the distribution
+        """
+        return self.sorted_samples[(rng.random(size) * len(self.sorted_samples)).astype(np.int64)]
+
+
+class DistributionSampler:
+    """
+    Samples (with replacement) from an empirical distribution through its sampling table (AliasTable or InverseCDF,
+    built once per distribution and shared by the trials), served from large pre-drawn blocks refilled lazily, instead
+    of one np.random.choice call per sample.
+    """
+    def __init__(self, table, rng, block_size=4096):
+        self.table = table
+        self.rng = rng
+        self.block_size = block_size
+        self.block = np.empty(0)
+        self.position = 0
+
+    def refill(self, n):
+        """
+        Draws a new block holding at least n samples, keeping the samples not served yet.
+
+        Args
+            :n (int): number of samples needed
+        """
+        size = max(self.block_size, n)
+        self.block = np.concatenate((self.block[self.position:], self.table.sample(self.rng, size)))
+        self.position = 0
+
+    def sample(self):
+        """
+        Returns a single sample.
+        """
+        if self.position >= len(self.block):
+            self.refill(1)
+        self.position += 1
+        return self.block[self.position - 1]
+
+    def sample_many(self, n):
+        """
+        Returns n samples as a Numpy array.
+
+        Args
+            :n (int): number of samples
+        Returns
+            :samples (Numpy array): samples from the distribution
+        """
+        if self.position + n > len(self.block):
+            self.refill(n)
+        self.position += n
+        return self.block[self.position - n:self.position]
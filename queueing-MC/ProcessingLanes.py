@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class ProcessingLanes:
+    """
+    Remediation processing queues as fixed resources x resources_qmax slot arrays: the defect treated in each slot,
+    when its remediation started and when it is due. Finding the remediated defects is then a single vectorized
+    comparison of the due times against the current time.
+    """
+    def __init__(self, resources, resources_qmax):
+        self.defect = np.full((resources, resources_qmax), -1, dtype=np.int64) # -1 = empty slot
+        self.start = np.full((resources, resources_qmax), np.nan)
+        self.due = np.full((resources, resources_qmax), np.inf)               # inf = empty slot or never completes
+
+    def __len__(self):
+        return int(np.count_nonzero(self.defect >= 0))
+
+    def assign(self, lane, slot, defect, start, remediation_time):
+        """
+        Puts a defect in a slot of a processing queue.
+
+        Args
+            :lane (int): processing queue index
+            :slot (int): slot index in the processing queue
+            :defect (int): defect row in defect_log
+            :start (float): remediation start time
+            :remediation_time (float): time needed to remediate the defect
+        Returns
+            :due (float): remediation completion time (inf if it never completes)
+        """
+        self.defect[lane, slot] = defect
+        self.start[lane, slot] = start
+        self.due[lane, slot] = start + remediation_time if remediation_time != 0 else np.inf # a zero remediation time never completes
+        return self.due[lane, slot]
+
+    def release(self, lane, slot):
+        """
+        Empties a slot of a processing queue.
+
+        Args
+            :lane (int): processing queue index
+            :slot (int): slot index in the processing queue
+        Returns
+            :defect (int): defect row in defect_log that was in the slot
+        """
+        defect = self.defect[lane, slot]
+        self.defect[lane, slot] = -1
+        self.start[lane, slot] = np.nan
+        self.due[lane, slot] = np.inf
+        return defect
+
+    def empty_slots(self, lane=None):
+        """
+        Returns the (lane, slot) index arrays of the empty slots, in lane order (only the slot indices if lane is given).
+        """
+        if lane is not None:
+            return np.flatnonzero(self.defect[lane] < 0)
+        return np.nonzero(self.defect < 0)
+
+    def completed_slots(self, t):
+        """
+        Returns the (lane, slot) index arrays of the slots whose defect is remediated at time t, in lane order.
+        """
+        return np.nonzero(self.due <= t)
+
+    def in_flight(self):
+        """
+        Returns the (lane, slot, defect row) arrays of the defects being treated.
+        """
+        lanes, slots = np.nonzero(self.defect >= 0)
+        return lanes, slots, self.defect[lanes, slots]
@@ -0,0 +1,232 @@
+import numpy as np
+from reconstruct_backlog import backlog_error_bound, backlog_trace, band_name
+
+
+class TrialAggregator:
+    """
+    Streaming aggregate of the Monte Carlo trials. Each finished trial is folded into per-hour backlog histograms,
+    per defect type waiting-time and remediation-time histograms and throughput counters, after which its defect log
+    can be dropped: memory grows with hours x log(backlog size) rather than with trials x defects. The backlog is a
+    whole number, binned exactly below 2 x backlog_precision and in backlog_precision bins per doubling above (bins of
+    relative width 1/backlog_precision at most), so its per-hour quantiles are exact for small backlogs and within
+    1/(2 x backlog_precision) of the value otherwise; times are binned every bin_width hours. With remediation times
+    quantized to resolution hours, the largest error bound of any trial is kept per hour.
+    """
+    def __init__(self, defect_types, bin_width=0.05, resolution=0, backlog_precision=64):
+        if backlog_precision < 1 or backlog_precision & (backlog_precision - 1):
+            raise ValueError("backlog_precision: Must be a power of 2")
+        self.defect_types = list(defect_types)
+        self.bin_width = bin_width
+        self.resolution = resolution
+        self.backlog_precision = backlog_precision
+        self.trials = 0
+        self.backlog_hist = np.zeros((0, 0), dtype=np.int64)                         # [hour, backlog bin] -> samples
+        self.wait_hist = np.zeros((len(self.defect_types), 0), dtype=np.int64)        # [type, time bin] -> defects
+        self.remediation_hist = np.zeros((len(self.defect_types), 0), dtype=np.int64) # [type, time bin] -> defects
+        self.created = np.zeros(len(self.defect_types), dtype=np.int64)
+        self.started = np.zeros(len(self.defect_types), dtype=np.int64)
+        self.remediated = np.zeros(len(self.defect_types), dtype=np.int64)
+        self.remediated_per_hour = np.zeros((len(self.defect_types), 0), dtype=np.int64) # [type, hour] -> defects
+        self.error_bound = np.zeros(0)                                                     # [hour] -> backlog error bound
+
+    def __len__(self):
+        return self.trials
+
+    def grow(self, name, shape):
+        """
+        Grows a histogram (zero padded) to at least shape.
+
+        Args
+            :name (str): histogram attribute
+            :shape (tuple): minimum shape
+        """
+        hist = getattr(self, name)
+        if all(current >= needed for current, needed in zip(hist.shape, shape)):
+            return
+        new = np.zeros(tuple(max(current, needed) for current, needed in zip(hist.shape, shape)), dtype=hist.dtype)
+        new[tuple(slice(0, current) for current in hist.shape)] = hist
+        setattr(self, name, new)
+
+    def backlog_bins(self, backlog):
+        """
+        Histogram bin of each backlog value: one bin per value below 2 x backlog_precision, then backlog_precision
+        bins per doubling ([2^k, 2^(k+1)) split in bins of 2^k / backlog_precision values).
+
+        Args
+            :backlog (Numpy array): backlog values (whole numbers)
+        Returns
+            :bins (Numpy array): bin index of each value
+        """
+        backlog = np.asarray(backlog, dtype=np.int64)
+        bits = int(self.backlog_precision).bit_length() - 1
+        exponent = np.frexp(np.maximum(backlog, 1).astype(np.float64))[1].astype(np.int64) - 1 # 2^exponent <= backlog < 2^(exponent+1)
+        exponent = np.maximum(exponent, bits + 1)
+        width = np.left_shift(1, exponent - bits)
+        wide = 2 * self.backlog_precision + (exponent - bits - 1) * self.backlog_precision + (backlog - np.left_shift(1, exponent)) // width
+        return np.where(backlog < 2 * self.backlog_precision, backlog, wide)
+
+    def backlog_values(self):
+        """
+        Backlog value of each bin of backlog_hist: the value itself for the exact bins, the middle of the values it
+        covers otherwise.
+
+        Returns
+            :values (Numpy array): backlog value of each bin
+        """
+        bins = np.arange(self.backlog_hist.shape[1])
+        bits = int(self.backlog_precision).bit_length() - 1
+        above = np.maximum(bins - 2 * self.backlog_precision, 0)
+        exponent = bits + 1 + above // self.backlog_precision
+        width = np.left_shift(1, exponent - bits)
+        wide = np.left_shift(1, exponent) + (above % self.backlog_precision) * width + (width - 1) / 2
+        return np.where(bins < 2 * self.backlog_precision, bins, wide)
+
+    def add(self, defect_log, t_end):
+        """
+        Folds a finished trial into the aggregate.
+
+        Args
+            :defect_log (DefectStore): simulation defect log of the trial
+            :t_end (float): simulation end time of the trial
+        """
+        self.trials += 1
+        type_code = defect_log['type_code']
+        t_created = defect_log['t_created']
+        start = defect_log['processing_start_time']
+        end = defect_log['processing_end_time']
+        started, remediated = ~np.isnan(start), ~np.isnan(end)
+
+        #### BACKLOG, SAMPLED "ON THE HOUR" AND AT EACH REMEDIATION (HOUR h COLLECTS [h-1, h)) ####
+        times, backlog = backlog_trace(defect_log, t_end)
+        times, backlog = times[times < int(t_end)], backlog[times < int(t_end)]
+        hour = np.floor(times).astype(np.int64)
+        if len(times) > 0:
+            bins = self.backlog_bins(backlog)
+            self.grow('backlog_hist', (int(t_end), bins.max() + 1)) # new bins only once the backlog doubles
+            np.add.at(self.backlog_hist, (hour, bins), 1) # in place, temporaries the size of the trial's samples only
+        if self.resolution > 0:
+            ### every trial moves by at most its own bound, so does any quantile across trials
+            error_bound = backlog_error_bound(defect_log, int(t_end), self.resolution)
+            self.grow('error_bound', error_bound.shape)
+            self.error_bound[:len(error_bound)] = np.maximum(self.error_bound[:len(error_bound)], error_bound)
+
+        #### WAITING TIMES, REMEDIATION TIMES AND THROUGHPUT (PER DEFECT TYPE) ####
+        ### the time-step engine refills a slot at the due time of its previous defect, which can fall just before the hour
+        ### the next defect was created, hence a slightly negative wait counted as no wait
+        wait_bin = np.maximum(np.floor((start[started] - t_created[started]) / self.bin_width), 0).astype(np.int64)
+        remediation_bin = np.floor(defect_log['remediation_time'] / self.bin_width).astype(np.int64)
+        end_hour = np.floor(end[remediated]).astype(np.int64)
+        self.grow('wait_hist', (len(self.defect_types), wait_bin.max(initial=-1) + 1))
+        self.grow('remediation_hist', (len(self.defect_types), remediation_bin.max(initial=-1) + 1))
+        self.grow('remediated_per_hour', (len(self.defect_types), end_hour.max(initial=-1) + 1))
+        for code in range(len(self.defect_types)):
+            self.wait_hist[code] += np.bincount(wait_bin[type_code[started] == code], minlength=self.wait_hist.shape[1])
+            self.remediation_hist[code] += np.bincount(remediation_bin[type_code == code], minlength=self.remediation_hist.shape[1])
+            self.remediated_per_hour[code] += np.bincount(end_hour[type_code[remediated] == code], minlength=self.remediated_per_hour.shape[1])
+        self.created += np.bincount(type_code, minlength=len(self.defect_types))
+        self.started += np.bincount(type_code[started], minlength=len(self.defect_types))
+        self.remediated += np.bincount(type_code[remediated], minlength=len(self.defect_types))
+
+    def hist_quantiles(self, hist, q):
+        """
+        Quantiles of the rows of a histogram (bin index of the first bin reaching each quantile, -1 for empty rows).
+
+        Args
+            :hist (Numpy array): histograms, one per row
+            :q (array-like): quantiles, between 0 and 1
+        Returns
+            :quantiles (Numpy array): bin index of each quantile (rows x quantiles)
+        """
+        cumulative = np.cumsum(hist, axis=1)
+        total = cumulative[:, -1] if hist.shape[1] > 0 else np.zeros(hist.shape[0], dtype=np.int64)
+        quantiles = np.array([np.searchsorted(row, np.maximum(np.atleast_1d(q) * row_total, 1), side='left') for row, row_total in zip(cumulative, total)], dtype=np.int64).reshape(hist.shape[0], -1)
+        quantiles[total == 0] = -1
+        return quantiles
+
+    def backlog_quantiles(self, q):
+        """
+        Quantiles of the backlog, per hour.
+
+        Args
+            :q (array-like): quantiles, between 0 and 1
+        Returns
+            :quantiles (Numpy array): backlog quantiles (hours x quantiles), hour h covering [h-1, h), -1 for hours without samples
+        """
+        quantiles = self.hist_quantiles(self.backlog_hist, q)
+        return np.where(quantiles >= 0, self.backlog_values()[np.maximum(quantiles, 0)], -1)
+
+    def quantile_bands(self, quantiles=(0, 0.25, 0.5, 0.75, 1)):
+        """
+        Quantile bands of the backlog per hour, in the table format of reconstruct_backlog.quantile_bands (computed over
+        the backlog samples of the hour rather than over hourly averages).
+
+        Args
+            :quantiles (tuple): quantiles of the bands, between 0 and 1
+        Returns
+            :bands_df (Polars DataFrame): one row per hour, with the mean and one column per quantile (min, max, median, pNN), plus error_bound if resolution > 0
+        """
+        import polars as pl
+        values = self.backlog_values()
+        samples = self.backlog_hist.sum(axis=1)
+        bands = self.backlog_quantiles(quantiles).T
+        bands = np.where(samples > 0, bands, np.nan) # NaN: hours without samples (closed history in cold storage)
+        return pl.DataFrame({'hour': np.arange(1, self.backlog_hist.shape[0] + 1),
+                             'mean': np.where(samples > 0, self.backlog_hist @ values / np.maximum(samples, 1), np.nan),
+                             **{band_name(q): band for q, band in zip(quantiles, bands)},
+                             **({'error_bound': np.pad(self.error_bound, (0, self.backlog_hist.shape[0] - len(self.error_bound)))} if self.resolution > 0 else {})})
+
+    def wait_quantiles(self, q):
+        """
+        Quantiles of the waiting time (backlog to start of remediation), per defect type.
+
+        Args
+            :q (array-like): quantiles, between 0 and 1
+        Returns
+            :quantiles (Numpy array): waiting-time quantiles in hours, middle of the bin (defect types x quantiles)
+        """
+        quantiles = self.hist_quantiles(self.wait_hist, q)
+        return np.where(quantiles >= 0, (quantiles + 0.5) * self.bin_width, np.nan)
+
+    def boxplot_stats(self):
+        """
+        Box plot statistics of the backlog per hour (quartiles, and whiskers at the most extreme backlog within 1.5 IQR),
+        in the format of matplotlib Axes.bxp. Hours without samples (closed history in cold storage) are left out.
+
+        Returns
+            :stats (list): one dict per hour, labelled with the hour
+        """
+        stats = []
+        values = self.backlog_values()
+        for hour, (q1, median, q3) in enumerate(self.backlog_quantiles([0.25, 0.5, 0.75])):
+            seen = values[self.backlog_hist[hour] > 0]
+            if len(seen) == 0:
+                continue
+            iqr = q3 - q1
+            stats.append({'label': hour + 1,
+                          'med': median,
+                          'q1': q1,
+                          'q3': q3,
+                          'whislo': seen[seen >= q1 - 1.5 * iqr].min(),
+                          'whishi': seen[seen <= q3 + 1.5 * iqr].max(),
+                          'fliers': []})
+        return stats
+
+    def summary(self):
+        """
+        Throughput and waiting-time summary, one row per defect type (counts summed over the trials).
+
+        Returns
+            :summary_df (Polars DataFrame): throughput and waiting-time summary
+        """
+        import polars as pl
+        wait_middle = (np.arange(self.wait_hist.shape[1]) + 0.5) * self.bin_width
+        started = np.maximum(self.started, 1)
+        quantiles = self.wait_quantiles([0.5, 0.9])
+        return pl.DataFrame({'defect_type': self.defect_types,
+                             'created': self.created,
+                             'started': self.started,
+                             'remediated': self.remediated,
+                             'remediated_per_trial': self.remediated / max(self.trials, 1),
+                             'mean_wait': (self.wait_hist @ wait_middle) / started,
+                             'median_wait': quantiles[:, 0],
+                             'p90_wait': quantiles[:, 1]})
@@ -1,5 +1,11 @@
+import os
 import pickle
 import time
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from Checkpoint import Checkpoint
+from TrialAggregator import TrialAggregator
 # from defectSimulation_v2 import defectRemediationSimulator
 
 def backlog_simulation(args, defect_simulation, dt):
@@ -12,17 +18,27 @@ def backlog_simulation(args, defect_simulation, dt):
         :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
     Returns
         :incoming_defects_dict (dict): tracks the incoming defects generated throughout the simulation (per defect type)
-        :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations
+        :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations (only the first --keep_logs defect logs if aggregating)
+        :trial_aggregate (TrialAggregator): streaming aggregate of the trials (None if not aggregating)
     """
     #### Initialization of remaining variables ####
     trials = args.trials
     check_initial_state = args.check_initial_state == 'True'
     export_final_state = args.export_final_state == 'True'
+    aggregate = args.aggregate == 'True'
+    cold_history = args.cold_history == 'True'
+    if aggregate and export_final_state:
+        raise ValueError("export_final_state: Must keep the defect log of every trial, cannot be combined with aggregate")
+    trial_aggregate = TrialAggregator(defect_simulation.defect_type_dict.keys(), resolution=defect_simulation.remediation_resolution) if aggregate else None
 
     #### LOAD IN EXISTING STATE ####
     if check_initial_state:
-        with open(args.path_initial_state, 'rb') as f:
-            loaded_dict = pickle.load(f)
+        if os.path.isdir(args.path_initial_state):
+            loaded_dict = Checkpoint(args.path_initial_state) # trials are read lazily, one at a time
+        else:
+            ### pickled comparison_dict exported by a previous version (only load from a trusted source)
+            with open(args.path_initial_state, 'rb') as f:
+                loaded_dict = pickle.load(f)
         trials = len(loaded_dict.keys())
         # initial_backlogs = [0, 0, 0, 0, 0]
 
@@ -30,28 +46,149 @@ def backlog_simulation(args, defect_simulation, dt):
     ####### BACKLOG SIMULATION ########
     incoming_defects_dict = {}
     comparison_dict = {}
-    for i in range(trials):
-        start = time.time()
-        if check_initial_state:
-            initial_state = loaded_dict['trial{0}'.format(i+1)]
-        else:
-            initial_state = {}
-        times, incoming_defects, defect_log, backlog_queue_remaining = defect_simulation.simulate_defect_backlog(dt, initial_state)
-        end = time.time()
-        incoming_defects_dict['trial{0}'.format(i+1)] = incoming_defects
-        if args.t_end != 0:
-            comparison_dict['trial{0}'.format(i+1)] = {'simulation_time': end-start, 't_end': times[-1], 'time_step': dt, 'defect_log': defect_log}
-        else:
-            try:
-                comparison_dict['trial{0}'.format(i+1)] = {'simulation_time': end-start, 't_end': initial_state['t_end'], 'time_step': dt, 'defect_log': defect_log}
-            except KeyError:
-                ### t_end = 0 and initial_state empty, no simulation was done, considers only the initial conditions at t = 0
-                comparison_dict['trial{0}'.format(i+1)] = {'simulation_time': end-start, 't_end': 0, 'time_step': dt, 'defect_log': defect_log}
-        print(f'Elapsed time (trial {i+1}):', end-start, 'seconds')
-
-    ### SAVE SIMULATION RESULTS AS JSON ####
+    initial_states = [loaded_dict['trial{0}'.format(i+1)] if check_initial_state else {} for i in range(trials)]
+    seed_sequences = defect_simulation.trial_seed_sequences(trials) # one independent random stream per trial, whichever worker runs it
+    print('Seed:', defect_simulation.seed_sequence.entropy) # pass as --seed to replay this simulation
+    if args.engine == 'time_step':
+        ### the shortest remediation time of any type sets dt for all
+        print('Time step:', dt, 'hours, per defect type:', ', '.join(f'{key} {value:.4g}' for key, value in defect_simulation.time_steps().items()))
+    if args.engine == 'batch':
+        #### ALL TRIALS AT ONCE (ONE BATCH PER WORKER) ####
+        chunks = [chunk for chunk in np.array_split(np.arange(trials), args.workers) if len(chunk) > 0]
+        results = map_trials(simulate_batch,
+                             args.workers,
+                             itertools.repeat(defect_simulation),
+                             [[initial_states[i] for i in chunk] for chunk in chunks],
+                             [[seed_sequences[i] for i in chunk] for chunk in chunks])
+        for chunk, (times, incoming_defects, defect_logs, elapsed) in zip(chunks, results):
+            for index, i in enumerate(chunk):
+                incoming_defects_dict['trial{0}'.format(i+1)] = incoming_defects[index]
+                comparison_dict['trial{0}'.format(i+1)] = trial_results(args, times[index], initial_states[i], elapsed/len(chunk), dt, defect_logs[index])
+                fold_trial(args, i, comparison_dict['trial{0}'.format(i+1)], trial_aggregate)
+            print(f'Elapsed time (trials {chunk[0]+1}-{chunk[-1]+1}):', elapsed, 'seconds')
+    else:
+        results = map_trials(simulate_trial,
+                             args.workers,
+                             itertools.repeat(defect_simulation),
+                             itertools.repeat(args.engine),
+                             itertools.repeat(dt),
+                             initial_states,
+                             seed_sequences)
+        for i, (times, incoming_defects, defect_log, elapsed) in enumerate(results):
+            incoming_defects_dict['trial{0}'.format(i+1)] = incoming_defects
+            comparison_dict['trial{0}'.format(i+1)] = trial_results(args, times, initial_states[i], elapsed, dt, defect_log)
+            fold_trial(args, i, comparison_dict['trial{0}'.format(i+1)], trial_aggregate)
+            print(f'Elapsed time (trial {i+1}):', elapsed, 'seconds')
+
+    ### SAVE SIMULATION RESULTS AS A CHECKPOINT ####
     if export_final_state:
-        with open(args.path_final_state, 'wb') as f:
-            pickle.dump(comparison_dict, f)
+        Checkpoint.export(args.path_final_state, comparison_dict, cold_history)
+
+    return incoming_defects_dict, comparison_dict, trial_aggregate
+
+
+def map_trials(function, workers, *iterables):
+    """
+    Maps trials onto the simulation function, spread across a pool of worker processes if more than one worker. The
+    results are yielded one at a time, so each can be folded and dropped before the next one is held.
+
+    Args
+        :function (function): module-level simulation function (picklable)
+        :workers (int): number of worker processes
+        :iterables (iterables): arguments of the simulation function (per trial)
+    Returns
+        :results (generator): outputs of the simulation function, in trial order
+    """
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(function, *iterables) # map keeps the results in submission (trial) order
+    else:
+        yield from map(function, *iterables)
+
+
+def simulate_trial(defect_simulation, engine, dt, initial_state, seed_sequence):
+    """
+    Simulation of a single trial of the defect backlog.
+
+    Args
+        :defect_simulation (instance of class): instance of class DefectRemediationSimulator
+        :engine (str): simulation engine, 'time_step', 'adaptive' or 'event'
+        :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
+        :initial_state (dict): initial state of the defect log prior to simulation
+        :seed_sequence (Numpy SeedSequence): seeds the random streams of the trial
+    Returns
+        :times (Numpy array): time steps governing backlog simulation
+        :incoming_defects (dict): tracks the incoming defects generated throughout the simulation (per defect type)
+        :defect_log (dict): simulation defect log
+        :elapsed (float): elapsed time of the trial, in seconds
+    """
+    start = time.time()
+    if engine == 'event':
+        times, incoming_defects, defect_log, backlog_queue_remaining = defect_simulation.simulate_defect_backlog_events(initial_state, seed_sequence)
+    elif engine == 'adaptive':
+        times, incoming_defects, defect_log, backlog_queue_remaining = defect_simulation.simulate_defect_backlog(dt, initial_state, seed_sequence, adaptive=True)
+    else:
+        times, incoming_defects, defect_log, backlog_queue_remaining = defect_simulation.simulate_defect_backlog(dt, initial_state, seed_sequence)
+    end = time.time()
+    return times, incoming_defects, defect_log, end-start
+
 
-    return incoming_defects_dict, comparison_dict
\ No newline at end of file
+def simulate_batch(defect_simulation, initial_states, seed_sequences):
+    """
+    Simulation of a batch of trials of the defect backlog, advanced all at once.
+
+    Args
+        :defect_simulation (instance of class): instance of class DefectRemediationSimulator
+        :initial_states (list): initial state of the defect log prior to simulation (per trial)
+        :seed_sequences (list): seeds the random streams of each trial in the batch (Numpy SeedSequence)
+    Returns
+        :times (list): time steps governing backlog simulation (per trial)
+        :incoming_defects (list): tracks the incoming defects generated throughout the simulation (per trial, per defect type)
+        :defect_logs (list): simulation defect log (per trial)
+        :elapsed (float): elapsed time of the batch, in seconds
+    """
+    start = time.time()
+    times, incoming_defects, defect_logs, backlog_queues_remaining = defect_simulation.simulate_defect_backlog_batch(initial_states, seed_sequences)
+    end = time.time()
+    return times, incoming_defects, defect_logs, end-start
+
+
+def fold_trial(args, i, results, trial_aggregate):
+    """
+    If aggregating, folds a finished trial into the streaming aggregate and drops its defect log, unless it is among
+    the first --keep_logs trials.
+
+    Args
+        :args (argparse parser.parse_args()): parsed input arguments
+        :i (int): trial index
+        :results (dict): main results and defect log of the trial, as stored in comparison_dict
+        :trial_aggregate (TrialAggregator): streaming aggregate of the trials (None if not aggregating)
+    """
+    if trial_aggregate is None:
+        return
+    trial_aggregate.add(results['defect_log'], results['t_end'])
+    if i >= args.keep_logs:
+        del results['defect_log']
+
+
+def trial_results(args, times, initial_state, simulation_time, dt, defect_log):
+    """
+    Wraps the main results and defect log of a single trial.
+
+    Args
+        :args (argparse parser.parse_args()): parsed input arguments
+        :times (Numpy array): time steps governing backlog simulation
+        :initial_state (dict): initial state of the defect log prior to simulation
+        :simulation_time (float): elapsed time of the trial, in seconds
+        :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
+        :defect_log (dict): simulation defect log
+    Returns
+        :results (dict): main results and defect log of the trial, as stored in comparison_dict
+    """
+    if args.t_end != 0:
+        return {'simulation_time': simulation_time, 't_end': times[-1], 'time_step': dt, 'defect_log': defect_log}
+    try:
+        return {'simulation_time': simulation_time, 't_end': initial_state['t_end'], 'time_step': dt, 'defect_log': defect_log}
+    except KeyError:
+        ### t_end = 0 and initial_state empty, no simulation was done, considers only the initial conditions at t = 0
+        return {'simulation_time': simulation_time, 't_end': 0, 'time_step': dt, 'defect_log': defect_log}
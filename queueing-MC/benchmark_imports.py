@@ -0,0 +1,61 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+#### ENTRY POINTS (directory relative to the repository, module) ####
+ENTRY_POINTS = [('queueing-MC', 'queueing_main'),
+                ('queueing-MC', 'parameter_sweep'),
+                ('queueless-MC', 'queueless_main'),
+                ('queueless-MC/queueless-MC', 'queueing_main')]
+LAZY_MODULES = ['scipy', 'matplotlib'] # only imported on the code paths that need them
+
+parser = argparse.ArgumentParser(exit_on_error=False)
+parser.add_argument('--budget', type=float, default=0.5, help='Import time budget of each entry point, in seconds')
+parser.add_argument('--runs', type=int, default=5, help='Number of imports per entry point, the median is compared with the budget')
+
+
+def import_time(directory, module):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    Args
+        :directory (str): directory the module is imported from
+        :module (str): module name
+    Returns
+        :seconds (float): cumulative import time of the module
+        :imported (set): top-level packages imported along the way
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=directory, capture_output=True, text=True, check=True)
+    seconds = None
+    imported = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        imported.add(name.strip().split('.')[0])
+        if name.rstrip() == f' {module}': # top-level entry, not indented
+            seconds = int(cumulative) / 1e6
+    return seconds, imported
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    failed = False
+    for directory, module in ENTRY_POINTS:
+        timings = []
+        for _ in range(args.runs):
+            seconds, imported = import_time(os.path.join(root, directory), module)
+            timings.append(seconds)
+        median = statistics.median(timings)
+        eager = [name for name in LAZY_MODULES if name in imported]
+        over = median > args.budget
+        failed = failed or over or bool(eager)
+        print(f"{directory}/{module}.py: {median:.3f} s (budget {args.budget:.3f} s)"
+              + (' OVER BUDGET' if over else '')
+              + (f", imports {', '.join(eager)} at start-up" if eager else ''))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,118 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import pickle
+import sys
+import tempfile
+import numpy as np
+from queueing_main import parser as simulation_parser
+from initialize_simulation import initialize_simulation
+from backlog_simulation import backlog_simulation
+from Checkpoint import Checkpoint
+
+
+#### SMALL SIMULATION, RESUMED WITH EVERY ENGINE ####
+SIMULATION = ['--defect_labels', 'type1, type2, type3', '--defect_priority', '1, 2, 3',
+              '--maxValue_generation', '3, 2, 2', '--maxValue_remediation', '2.5, 3, 1.5',
+              '--skewness_generation', '2, 3, 4', '--skewness_remediation', '3, 4, 2',
+              '--initial_backlogs', '20, 10, 5', '--t_end', '30', '--resources', '3', '--resources_qmax', '2', '--trials', '4']
+ENGINES = ['time_step', 'adaptive', 'event', 'batch']
+#### EXPORTED WITH A LONG BACKLOG, RESUMED WITH EVERY NEW LEVEL ABOVE THE EXPORTED ONES ####
+### the new arrivals never leave the backlog empty, but types 1 and 2 leave room for the oldest defects of type 3
+EXPORT_PRIORITY = ['--defect_priority', '10, 20, 30', '--resources', '1']
+RESUME_PRIORITY = ['--defect_priority', '1, 2, 3', '--resources', '2', '--maxValue_generation', '3, 2, 10', '--t_end', '100']
+
+parser = argparse.ArgumentParser(exit_on_error=False)
+parser.add_argument('--workers', type=int, default=1, help='Number of worker processes the resumed trials are spread across (1 = serial)')
+parser.add_argument('--seed', type=int, default=1, help='Seed of the exported simulation (the resumed ones use seed + 1)')
+
+
+def run(options):
+    """
+    Runs a simulation quietly.
+
+    Args
+        :options (list): command-line options of queueing_main.py, on top of SIMULATION
+    Returns
+        :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations
+    """
+    args = simulation_parser.parse_args(SIMULATION + options)
+    defect_simulation, defect_type_dict, generation_distributions, remediation_distributions, dt = initialize_simulation(args)
+    with contextlib.redirect_stdout(io.StringIO()):
+        incoming_defects_dict, comparison_dict, trial_aggregate = backlog_simulation(args, defect_simulation, dt)
+    return comparison_dict
+
+
+def started(defect_log, defect_ids):
+    """
+    If the remediation of every defect of defect_ids has started in defect_log.
+
+    Args
+        :defect_log (DefectStore): simulation defect log of the resumed simulation
+        :defect_ids (Numpy array): defect_id of the defects open when the state was exported
+    Returns
+        :started (bool): if every defect has started
+    """
+    rows = np.isin(defect_log['defect_id'], defect_ids)
+    return rows.sum() == len(defect_ids) and not np.isnan(defect_log['processing_start_time'][rows]).any()
+
+
+def same_defects(defect_log, reference):
+    """
+    If every defect of defect_log is found in reference, with the same values (rows matched on defect_id, the closed
+    history read from cold storage coming first).
+
+    Args
+        :defect_log (DefectStore): defect log to check (e.g. read back from a checkpoint)
+        :reference (DefectStore): reference defect log, may hold more defects (closed history in cold storage)
+    Returns
+        :same (bool): if the defects match
+    """
+    order = np.argsort(reference['defect_id'])
+    rows = order[np.searchsorted(reference['defect_id'], defect_log['defect_id'], sorter=order).clip(max=len(order) - 1)]
+    return all(np.array_equal(defect_log[column], reference[column][rows], equal_nan=True) for column in defect_log.columns)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    multiprocessing.set_start_method('spawn') # Polars runs in this process before the workers start, forking it could deadlock
+    failed = False
+    with tempfile.TemporaryDirectory() as path:
+        for cold_history in ['False', 'True']:
+            #### EXPORT, READ BACK ####
+            checkpoint = os.path.join(path, f'cold_{cold_history}')
+            exported = run(['--seed', str(args.seed), '--export_final_state', 'True', '--path_final_state', checkpoint, '--cold_history', cold_history])
+            with open(checkpoint + '.pkl', 'wb') as file:
+                pickle.dump(exported, file) # same state, through the pickle path of previous versions
+            loaded = Checkpoint(checkpoint)
+            ok = all(same_defects(loaded[trial].full_defect_log(), exported[trial]['defect_log']) and len(loaded[trial].full_defect_log()) == len(exported[trial]['defect_log']) for trial in exported)
+            failed = failed or not ok
+            print(f"cold_history {cold_history}, export -> read: {'ok' if ok else 'MISMATCH'}")
+
+            #### RESUME FROM THE CHECKPOINT AND FROM THE PICKLE, SAME SEED ####
+            for engine in ENGINES:
+                options = ['--engine', engine, '--workers', str(args.workers), '--seed', str(args.seed + 1), '--check_initial_state', 'True']
+                resumed = run(options + ['--path_initial_state', checkpoint, '--export_final_state', 'True', '--path_final_state', checkpoint + f'_{engine}', '--cold_history', cold_history])
+                reference = run(options + ['--path_initial_state', checkpoint + '.pkl'])
+                chained = Checkpoint(checkpoint + f'_{engine}')
+                ok = all(same_defects(resumed[trial]['defect_log'], reference[trial]['defect_log'])
+                         and len(chained[trial].full_defect_log()) == len(reference[trial]['defect_log']) for trial in reference)
+                failed = failed or not ok
+                print(f"cold_history {cold_history}, resume ({engine}, {args.workers} workers): {'ok' if ok else 'MISMATCH'}")
+
+        #### RESUME WITH OTHER PRIORITIES: THE CARRIED-OVER DEFECTS TAKE THE NEW LEVELS ####
+        checkpoint = os.path.join(path, 'priority')
+        exported = run(['--seed', str(args.seed), '--export_final_state', 'True', '--path_final_state', checkpoint] + EXPORT_PRIORITY)
+        with open(checkpoint + '.pkl', 'wb') as file:
+            pickle.dump(exported, file)
+        open_ids = {trial: exported[trial]['defect_log']['defect_id'][exported[trial]['defect_log'].open_rows()] for trial in exported}
+        for engine in ENGINES:
+            options = ['--engine', engine, '--workers', str(args.workers), '--seed', str(args.seed + 1), '--check_initial_state', 'True'] + RESUME_PRIORITY
+            resumed = run(options + ['--path_initial_state', checkpoint])
+            reference = run(options + ['--path_initial_state', checkpoint + '.pkl'])
+            ok = all(started(resumed[trial]['defect_log'], open_ids[trial]) and same_defects(resumed[trial]['defect_log'], reference[trial]['defect_log']) for trial in reference)
+            failed = failed or not ok
+            print(f"priority {EXPORT_PRIORITY[1]} -> {RESUME_PRIORITY[1]}, resume ({engine}, {args.workers} workers): {'ok' if ok else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
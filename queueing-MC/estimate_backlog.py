@@ -0,0 +1,140 @@
+import numpy as np
+
+
+def estimate_backlog(defect_simulation):
+    """
+    Analytic steady-state estimate of the defect backlog, without simulation. The processing slots are treated as a
+    non-preemptive priority M/G/c queue with c = resources * resources_qmax servers: the FCFS waiting time comes from
+    Erlang C with the Allen-Cunneen (Ca^2 + Cs^2)/2 correction, and is split among priority levels with Cobham's
+    M/G/1 priority factors. Since defects come in "on the hour", each defect also waits behind the defects of higher
+    (or equal, earlier) priority arriving in the same hour, computed from the exact distribution of the hourly counts.
+    Defects waiting and being treated follow from Little's law.
+
+    Args
+        :defect_simulation (instance of class): instance of class DefectRemediationSimulator, with generated distributions
+    Returns
+        :estimate_dict (dict): steady-state estimate per defect type, plus the totals of the whole system under 'system'
+    """
+    servers = defect_simulation.resources * defect_simulation.resources_qmax
+    defect_types = list(defect_simulation.defect_type_dict.keys())
+
+    #### MOMENTS OF THE GENERATION AND REMEDIATION HISTOGRAMS (PER DEFECT TYPE) ####
+    priority = np.array([defect_simulation.defect_type_dict[key]['priority'] for key in defect_types])
+    arrival_rate = np.array([np.mean(defect_simulation.generation_distributions[key]) for key in defect_types])     # defects / hr
+    arrival_variance = np.array([np.var(defect_simulation.generation_distributions[key]) for key in defect_types])
+    service_mean = np.array([np.mean(defect_simulation.remediation_distributions[key]) for key in defect_types])    # hrs
+    service_second = np.array([np.mean(np.square(defect_simulation.remediation_distributions[key])) for key in defect_types])
+    load = arrival_rate * service_mean / servers # utilization of the servers (per defect type)
+
+    #### FCFS M/G/c WAITING TIME OF THE WHOLE SYSTEM ####
+    total_rate = arrival_rate.sum()
+    utilization = load.sum()
+    stable = utilization < 1
+    mean_service = np.sum(arrival_rate * service_mean) / total_rate if total_rate > 0 else 0.0
+    if total_rate > 0 and stable:
+        cs2 = np.sum(arrival_rate * service_second) / total_rate / mean_service**2 - 1 if mean_service > 0 else 0.0
+        ca2 = arrival_variance.sum() / total_rate # index of dispersion of the hourly arrival counts
+        wait_fcfs = erlang_c(servers, total_rate * mean_service) * mean_service / (servers * (1 - utilization)) * (ca2 + cs2) / 2
+    else:
+        wait_fcfs = 0.0 if total_rate == 0 else np.inf
+    count_pmf = [np.bincount(np.asarray(defect_simulation.generation_distributions[key], dtype=int)) / len(defect_simulation.generation_distributions[key]) for key in defect_types]
+
+    #### PRIORITY LEVELS (LOWER = HIGHER PRIORITY) ####
+    load_above = np.array([load[priority < level].sum() for level in priority])    # load of the higher priority levels
+    load_through = np.array([load[priority <= level].sum() for level in priority]) # load up to and including the level
+    level_stable = load_through < 1 # a level is caught up only if it and the levels above it fit in the capacity
+    if stable:
+        waiting_time = wait_fcfs * (1 - utilization) / ((1 - load_above) * (1 - load_through))
+        for level in np.unique(priority):
+            waiting_time[priority == level] += hourly_wait(servers,
+                                                           mean_service,
+                                                           [count_pmf[index] for index in np.flatnonzero(priority < level)],
+                                                           [count_pmf[index] for index in np.flatnonzero(priority == level)])
+    else:
+        ### overloaded system, the levels that are caught up are left unestimated (nan), the others never are (inf)
+        waiting_time = np.where(level_stable, np.nan, np.inf)
+
+    estimate_dict = {}
+    for index, key in enumerate(defect_types):
+        estimate_dict[key] = {'priority': int(priority[index]),
+                              'arrival_rate': arrival_rate[index],
+                              'mean_remediation_time': service_mean[index],
+                              'utilization': load[index],
+                              'stable': bool(level_stable[index]),
+                              'waiting_time': waiting_time[index],
+                              'backlog': arrival_rate[index] * waiting_time[index], # Little's law
+                              'in_process': arrival_rate[index] * service_mean[index]}
+    estimate_dict['system'] = {'servers': servers,
+                               'arrival_rate': total_rate,
+                               'capacity': servers / mean_service if mean_service > 0 else np.inf, # defects / hr
+                               'utilization': utilization,
+                               'stable': bool(stable),
+                               'backlog': np.sum([estimate_dict[key]['backlog'] for key in defect_types]),
+                               'in_process': np.sum([estimate_dict[key]['in_process'] for key in defect_types])}
+    return estimate_dict
+
+
+def erlang_c(servers, offered_load):
+    """
+    Probability that an arriving defect has to wait in an M/M/c queue (Erlang C), through the Erlang B recursion.
+
+    Args
+        :servers (int): number of servers
+        :offered_load (float): arrival rate x mean service time, must be below servers
+    Returns
+        :probability (float): probability of waiting
+    """
+    erlang_b = 1.0
+    for k in range(1, servers + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+    utilization = offered_load / servers
+    return erlang_b / (1 - utilization * (1 - erlang_b))
+
+
+def hourly_wait(servers, mean_service, pmf_above, pmf_level):
+    """
+    Mean wait of a defect behind the defects arriving in the same hour: all those of higher priority levels, and those
+    of its own level queued before it (uniform position among them). Defects beyond the servers wait for completions,
+    which come every mean_service/servers hours.
+
+    Args
+        :servers (int): number of servers
+        :mean_service (float): mean remediation time, in hours
+        :pmf_above (list): distributions of the hourly counts of the higher priority defect types (Numpy arrays)
+        :pmf_level (list): distributions of the hourly counts of the defect types of the level (Numpy arrays)
+    Returns
+        :wait (float): mean wait, in hours
+    """
+    ahead = np.array([1.0])
+    for pmf in pmf_above:
+        ahead = np.convolve(ahead, pmf)
+    level = np.array([1.0])
+    for pmf in pmf_level:
+        level = np.convolve(level, pmf)
+    mean_level = np.sum(np.arange(len(level)) * level)
+    if mean_level == 0:
+        return 0.0
+    position = level[::-1].cumsum()[::-1][1:] / mean_level # P(position = j) = P(count > j) / E[count] (size-biased count)
+    ahead = np.convolve(ahead, position)
+    return np.sum(np.maximum(np.arange(len(ahead)) - servers + 1, 0) * ahead) * mean_service / servers
+
+
+def report_estimate(estimate_dict):
+    """
+    Prints the steady-state estimate, flagging an unstable system (arrival rate at or above capacity).
+
+    Args
+        :estimate_dict (dict): steady-state estimate per defect type, plus the totals of the whole system under 'system'
+    """
+    system = estimate_dict['system']
+    print(f"Servers: {system['servers']}, arrival rate: {system['arrival_rate']:.3f} defects/hr, capacity: {system['capacity']:.3f} defects/hr, utilization: {system['utilization']:.3f}")
+    if not system['stable']:
+        print('UNSTABLE: arrival rate >= capacity, the backlog grows without bound (levels marked unstable are never caught up)')
+    for key, estimate in estimate_dict.items():
+        if key == 'system':
+            continue
+        print(f"{key} (priority {estimate['priority']}): arrival rate {estimate['arrival_rate']:.3f}/hr, "
+              f"waiting time {estimate['waiting_time']:.3f} hrs, backlog {estimate['backlog']:.3f}, in process {estimate['in_process']:.3f}"
+              + ('' if estimate['stable'] else ' UNSTABLE'))
+    if system['stable']:
+        print(f"Expected backlog: {system['backlog']:.3f} waiting + {system['in_process']:.3f} in process")
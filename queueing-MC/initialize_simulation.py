@@ -37,7 +37,10 @@ def initialize_simulation(args):
                                                    initial_backlogs,
                                                    t_end,
                                                    resources,
-                                                   resources_qmax)
+                                                   resources_qmax,
+                                                   id_prefix=args.id_prefix,
+                                                   seed=args.seed,
+                                                   remediation_resolution=args.remediation_resolution)
 
     defect_type_dict = defect_simulation.generate_type_dict() # map defect type to corresponing poisson_rate, skewness and initial_backlogs
     generation_distributions, remediation_distributions = defect_simulation.generate_distributions() # generate remediation time distribution for each defect type
@@ -0,0 +1,187 @@
+import copy
+import itertools
+import time
+import numpy as np
+from queueing_main import parser
+from initialize_simulation import initialize_simulation
+from backlog_simulation import map_trials, simulate_trial
+from estimate_backlog import estimate_backlog
+from reconstruct_backlog import backlog_trace, hourly_backlog
+
+
+#### SWEEP PARAMETERS (ON TOP OF THE SIMULATION PARAMETERS OF queueing_main.py) ####
+parser.add_argument('--design', type=str, default='grid', choices=['grid', 'lhs'], help="Design of experiments: 'grid' runs every combination of the swept values, 'lhs' a Latin hypercube of --samples combinations")
+parser.add_argument('--samples', type=int, default=10, help="If --design is 'lhs', number of configurations drawn (duplicates are run once)")
+parser.add_argument('--sweep_resources', type=str, help="List --resources values to sweep seperated by , (example: '2, 3, 4'), --resources only if not given")
+parser.add_argument('--sweep_resources_qmax', type=str, help="List --resources_qmax values to sweep seperated by , (example: '1, 2'), --resources_qmax only if not given")
+parser.add_argument('--sweep_defect_priority', type=str, help="List --defect_priority values to sweep seperated by ; (example: '1, 2, 3; 3, 2, 1'), --defect_priority only if not given")
+parser.add_argument('--path_sweep', type=str, default='sweep_results.csv', help="Path of the CSV table of results, one row per configuration and trial (example: 'sweep_results.csv')")
+parser.add_argument('--early_stopping', default=True, help='If stopping the trials of a configuration whose backlog clearly diverges, enter True; False otherwise')
+parser.add_argument('--min_trials', type=int, default=3, help='Trials run before a configuration can be stopped early, and between two checks')
+parser.add_argument('--divergence_slope', type=float, default=0, help='Backlog growth (defects/hour, over the second half of the simulation) a configuration is stopped at, once the lower 2-sigma bound of its mean across trials exceeds it')
+
+
+def design_configurations(levels, design, samples, rng):
+    """
+    Configurations of a sweep, from the values of each swept parameter.
+
+    Args
+        :levels (list): values of each swept parameter (list per parameter)
+        :design (str): 'grid' for every combination, 'lhs' for a Latin hypercube
+        :samples (int): number of configurations drawn by the Latin hypercube
+        :rng (Numpy Generator): random stream of the Latin hypercube
+    Returns
+        :configurations (list): one tuple of parameter values per configuration
+    """
+    if design == 'grid':
+        return list(itertools.product(*levels))
+    ### each parameter gets one draw per stratum of [0, 1), strata shuffled independently, mapped onto its values
+    strata = [(rng.permutation(samples) + rng.random(samples)) / samples for _ in levels]
+    configurations = [tuple(values[int(u * len(values))] for values, u in zip(levels, draw)) for draw in zip(*strata)]
+    return list(dict.fromkeys(configurations))
+
+
+def configure_simulation(defect_simulation, resources, resources_qmax, defect_priority):
+    """
+    Copy of the simulation with another configuration of resources and priorities. The type dict, distributions and
+    sampling tables are shared, and so are the random streams: every configuration sees the same arrivals and
+    remediation times in the same trial (common random numbers).
+
+    Args
+        :defect_simulation (instance of class): instance of class DefectRemediationSimulator, with generated distributions
+        :resources (int): available parallel resources
+        :resources_qmax (int): defects that can be alloted to each resource at any given time
+        :defect_priority (tuple): priority of each defect type
+    Returns
+        :simulation (instance of class): configured instance of class DefectRemediationSimulator
+    """
+    if len(defect_priority) != len(defect_simulation.defect_types):
+        raise ValueError("sweep_defect_priority: Must have one value for each defect type")
+    simulation = copy.copy(defect_simulation)
+    simulation.resources = resources
+    simulation.resources_qmax = resources_qmax
+    simulation.defect_priority = dict(zip(defect_simulation.defect_types, defect_priority))
+    simulation.defect_type_dict = {name: {**entry, 'priority': simulation.defect_priority[name]} for name, entry in defect_simulation.defect_type_dict.items()}
+    return simulation
+
+
+def trial_metrics(defect_log, t_end):
+    """
+    Summary of a single trial of a configuration.
+
+    Args
+        :defect_log (DefectStore): simulation defect log of the trial
+        :t_end (float): simulation end time of the trial
+    Returns
+        :metrics (dict): backlog (final, hourly mean and max, growth over the second half), defects remediated and mean waiting time
+    """
+    times, backlog = backlog_trace(defect_log, t_end)
+    hourly = hourly_backlog({0: times}, {0: backlog}, int(t_end))[0]
+    second_half = np.arange(len(hourly) // 2, len(hourly))
+    start = defect_log['processing_start_time']
+    started = ~np.isnan(start)
+    return {'final_backlog': len(defect_log.open_rows()),
+            'mean_backlog': hourly.mean() if len(hourly) > 0 else np.nan,
+            'max_backlog': hourly.max() if len(hourly) > 0 else np.nan,
+            'backlog_slope': np.polyfit(second_half, hourly[second_half], 1)[0] if len(second_half) > 1 else np.nan, # defects / hr
+            'remediated': int(np.count_nonzero(~np.isnan(defect_log['processing_end_time']))),
+            'mean_wait': np.mean(start[started] - defect_log['t_created'][started]) if started.any() else np.nan}
+
+
+def diverges(slopes, divergence_slope):
+    """
+    If the backlog of a configuration clearly diverges: the lower 2-sigma bound of its mean growth across the trials
+    run so far exceeds divergence_slope.
+
+    Args
+        :slopes (list): backlog growth of each trial run, in defects/hour
+        :divergence_slope (float): backlog growth a configuration is stopped at, in defects/hour
+    Returns
+        :diverged (bool): if the configuration can be stopped
+    """
+    if len(slopes) < 2:
+        return False
+    return np.mean(slopes) - 2 * np.std(slopes, ddof=1) / np.sqrt(len(slopes)) > divergence_slope
+
+
+def run_configuration(defect_simulation, engine, dt, configuration, trials, early_stopping, min_trials, divergence_slope):
+    """
+    Runs the trials of a single configuration, in blocks of min_trials, checking for divergence after each block.
+
+    Args
+        :defect_simulation (instance of class): instance of class DefectRemediationSimulator, with generated distributions
+        :engine (str): simulation engine, 'time_step', 'adaptive', 'event' or 'batch'
+        :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
+        :configuration (tuple): resources, resources_qmax and priority of each defect type
+        :trials (int): maximum number of trials
+        :early_stopping (bool): if stopping once the backlog clearly diverges
+        :min_trials (int): trials run before a check for divergence, and between two checks
+        :divergence_slope (float): backlog growth a configuration is stopped at, in defects/hour
+    Returns
+        :rows (list): results of each trial run (dict)
+        :diverged (bool): if the configuration was stopped early
+        :elapsed (float): elapsed time of the configuration, in seconds
+    """
+    start = time.time()
+    simulation = configure_simulation(defect_simulation, *configuration)
+    seed_sequences = simulation.trial_seed_sequences(trials) # the same for every configuration
+    rows, slopes, diverged = [], [], False
+    for block in np.array_split(np.arange(trials), np.arange(min_trials, trials, max(min_trials, 1))):
+        if engine == 'batch':
+            times, _, defect_logs, _ = simulation.simulate_defect_backlog_batch([{} for _ in block], [seed_sequences[i] for i in block])
+            results = [(times[index][-1] if len(times[index]) > 0 else 0, defect_logs[index]) for index in range(len(block))]
+        else:
+            results = []
+            for i in block:
+                times, _, defect_log, _ = simulate_trial(simulation, engine, dt, {}, seed_sequences[i])
+                results.append((times[-1] if len(times) > 0 else 0, defect_log))
+        for i, (t_end, defect_log) in zip(block, results):
+            rows.append({'trial': int(i) + 1, **trial_metrics(defect_log, t_end)})
+            slopes.append(rows[-1]['backlog_slope'])
+        if early_stopping and len(rows) < trials and diverges(slopes, divergence_slope):
+            diverged = True
+            break
+    return rows, diverged, time.time() - start
+
+
+if __name__ == "__main__":
+    ####### INITIALIZATION (ONCE FOR EVERY CONFIGURATION) #######
+    args = parser.parse_args()
+    defect_simulation, defect_type_dict, generation_distributions, remediation_distributions, dt = initialize_simulation(args)
+    levels = [list(map(int, args.sweep_resources.split(', '))) if args.sweep_resources else [args.resources],
+              list(map(int, args.sweep_resources_qmax.split(', '))) if args.sweep_resources_qmax else [args.resources_qmax],
+              [tuple(map(int, priority.split(', '))) for priority in args.sweep_defect_priority.split('; ')] if args.sweep_defect_priority else [tuple(map(int, args.defect_priority.split(', ')))]]
+    design_root = defect_simulation.spawn_seed_sequences(defect_simulation.seed_sequence, 3)[2] # children 0 and 1 seed the distributions and trials
+    configurations = design_configurations(levels, args.design, args.samples, np.random.default_rng(design_root))
+    print('Seed:', defect_simulation.seed_sequence.entropy) # pass as --seed to replay this sweep
+    print('Configurations:', len(configurations))
+
+    ####### SWEEP, CONFIGURATIONS SPREAD ACROSS THE WORKERS #######
+    results = map_trials(run_configuration,
+                         args.workers,
+                         itertools.repeat(defect_simulation),
+                         itertools.repeat(args.engine),
+                         itertools.repeat(dt),
+                         configurations,
+                         itertools.repeat(args.trials),
+                         itertools.repeat(args.early_stopping == True or args.early_stopping == 'True'),
+                         itertools.repeat(args.min_trials),
+                         itertools.repeat(args.divergence_slope))
+    table = []
+    for index, (configuration, (rows, diverged, elapsed)) in enumerate(zip(configurations, results)):
+        resources, resources_qmax, defect_priority = configuration
+        estimate = estimate_backlog(configure_simulation(defect_simulation, *configuration))['system']
+        for row in rows:
+            table.append({'configuration': index + 1,
+                          'resources': resources,
+                          'resources_qmax': resources_qmax,
+                          'defect_priority': ', '.join(map(str, defect_priority)),
+                          'utilization': estimate['utilization'], # analytic, see estimate_backlog
+                          'diverged': diverged,
+                          **row})
+        print(f'Configuration {index+1} (resources {resources}, resources_qmax {resources_qmax}, priority {defect_priority}):',
+              len(rows), 'trials', '(stopped early, backlog diverges)' if diverged else '', f'{elapsed:.2f} seconds')
+
+    ####### TIDY RESULTS TABLE #######
+    import polars as pl
+    pl.DataFrame(table).write_csv(args.path_sweep)
@@ -2,7 +2,8 @@ import argparse
 from DefectSimulation import DefectRemediationSimulator
 from initialize_simulation import initialize_simulation
 from backlog_simulation import backlog_simulation
-from visualize_simulation import visualize_simulation, visualize_generation_distributions, visualize_remediation_distributions
+from estimate_backlog import estimate_backlog, report_estimate
+from reconstruct_backlog import backlog_bands
 
 
 #### INPUT PARAMETERS ####
@@ -17,11 +18,25 @@ parser.add_argument('--initial_backlogs', type=str, help="List initial number of
 parser.add_argument('--t_end', type=float, help='End time for remediation simulation, in hours')
 parser.add_argument('--resources', type=int, help='Available parallel resources for treatment of defects')
 parser.add_argument('--resources_qmax', type=int, help='Maxmimum resources that can be alloted at any given time for treatment of defects')
+parser.add_argument('--engine', type=str, default='time_step', choices=['time_step', 'adaptive', 'event', 'batch'], help="Simulation engine: 'time_step' steps through the fixed time step dt, 'adaptive' runs the same steps but jumps from one hour or earliest pending remediation completion to the next instead of every dt (same results as 'event' and 'batch'; 'time_step' notices a completion falling between the last step and the hour on the hour, and can refill its slot with that hour's arrivals), 'event' jumps from one arrival or remediation completion to the next, 'batch' advances all trials at once as Numpy arrays")
+parser.add_argument('--remediation_resolution', type=float, default=0, help='Rounds the remediation times to multiples of this many hours (0 = no rounding), trading accuracy for a larger dt; the quantile bands then carry the error bound on the backlog (example: 0.1)')
+parser.add_argument('--workers', type=int, default=1, help='Number of worker processes the trials are spread across (1 = serial)')
+parser.add_argument('--id_prefix', type=str, default='ID', help="Prefix of the defect IDs (example: 'ID' gives 'ID_1', 'ID_2', ...), states loaded with --check_initial_state keep their own prefix")
+parser.add_argument('--seed', type=int, default=None, help='Seed of the random streams (distributions and every trial), the same seed replays the same simulation whatever --workers is; a fresh seed is drawn and printed if not given')
 parser.add_argument('--trials', type=int, help='Number of times to run the full simulation')
+parser.add_argument('--estimate', default=False, help='If only the analytic steady-state estimate of the backlog is needed (priority M/G/c approximation, no simulation), enter True; False otherwise')
+parser.add_argument('--aggregate', default=False, help='If folding each finished trial into streaming statistics (per-hour backlog histograms, waiting-time histograms, throughput) and dropping its defect log, enter True; False otherwise')
+parser.add_argument('--keep_logs', type=int, default=0, help='If --aggregate is True, number of trials (the first ones) whose defect log is kept in comparison_dict for debugging')
+parser.add_argument('--export_quantile_bands', default=False, help='If exporting the per-hour quantile bands of the backlog across trials (min, quartiles, median, max, mean) as a table, enter True; False otherwise')
+parser.add_argument('--path_quantile_bands', type=str, help="If --export_quantile_bands is True, provide the path of the CSV table (example: 'quantile_bands.csv')")
+parser.add_argument('--no_plots', default=False, help='If skipping the figures altogether (matplotlib is not even imported), enter True; False otherwise')
+parser.add_argument('--headless', default=False, help='If rendering the figures as PNG files without opening any window (Agg backend, in parallel across --workers, figures whose input data is unchanged are skipped), enter True; False otherwise')
+parser.add_argument('--path_figures', type=str, default='figures', help="If --headless is True, directory of the PNG files (example: 'figures')")
 parser.add_argument('--check_initial_state', default=False, help='If importing an existing simulation to continue, enter True; False otherwise')
-parser.add_argument('--path_initial_state', type=str, help="If --check_initial_state is True, provide the path to the existing simulation (example: 'initial_state_path.pkl')")
+parser.add_argument('--path_initial_state', type=str, help="If --check_initial_state is True, provide the path to the existing simulation, a checkpoint directory or a pickle exported by a previous version (example: 'initial_state_checkpoint')")
 parser.add_argument('--export_final_state', default=False, help='If exporting current simulation, enter True; False otherwise')
-parser.add_argument('--path_final_state', type=str, help="If --export_final_state is True, provide the path to store the simulation (example: 'final_state_path.pkl')")
+parser.add_argument('--path_final_state', type=str, help="If --export_final_state is True, provide the path of the checkpoint directory to store the simulation (example: 'final_state_checkpoint')")
+parser.add_argument('--cold_history', default=False, help='If --export_final_state is True, enter True to move the remediated defects to cold storage segments of the checkpoint, so that continuing only reads the open defects; False otherwise')
 ### add paths for importing + exporting
 
 if __name__ == "__main__":
@@ -29,10 +44,40 @@ if __name__ == "__main__":
     args = parser.parse_args()
     defect_simulation, defect_type_dict, generation_distributions, remediation_distributions, dt = initialize_simulation(args)
 
+    ####### ANALYTIC ESTIMATE #######
+    if args.estimate == 'True':
+        report_estimate(estimate_backlog(defect_simulation))
+        raise SystemExit
+
     ####### BACKLOG SIMULATION #######
-    incoming_defects_dict, comparison_dict = backlog_simulation(args, defect_simulation, dt)
+    incoming_defects_dict, comparison_dict, trial_aggregate = backlog_simulation(args, defect_simulation, dt)
+
+    ####### BACKLOG QUANTILE BANDS #######
+    if args.export_quantile_bands == 'True':
+        bands_df = trial_aggregate.quantile_bands() if trial_aggregate is not None else backlog_bands(comparison_dict, resolution=args.remediation_resolution)
+        bands_df.write_csv(args.path_quantile_bands)
     
+    if trial_aggregate is not None:
+        print(trial_aggregate.summary())
+
     ####### VISUALIZATION #######
-    visualize_simulation(comparison_dict)                                                                   # defect backlog
-    visualize_generation_distributions(defect_type_dict, incoming_defects_dict, generation_distributions)   # number of incoming defects / hour distributions
-    visualize_remediation_distributions(defect_type_dict, comparison_dict, remediation_distributions)       # remediation time distributions
\ No newline at end of file
+    if args.no_plots != 'True':
+        if args.headless == 'True':
+            import matplotlib
+            matplotlib.use('Agg') # before pyplot is first imported
+        from visualize_simulation import visualize_simulation, visualize_aggregate, visualize_generation_distributions, visualize_remediation_distributions
+        from render_figures import render_figures, show_figures
+
+        ### the wall-clock timings are left out, so that the same simulation hashes the same
+        plot_dict = {trial: {key: value for key, value in results.items() if key != 'simulation_time'} for trial, results in comparison_dict.items()}
+        if trial_aggregate is not None:
+            backlog_job = ('backlog', visualize_aggregate, (trial_aggregate, plot_dict))                                            # defect backlog (streaming aggregate)
+        else:
+            backlog_job = ('backlog', visualize_simulation, (plot_dict, args.remediation_resolution))                                # defect backlog
+        figure_jobs = [backlog_job,
+                       ('generation_distributions', visualize_generation_distributions, (defect_type_dict, incoming_defects_dict, generation_distributions)), # number of incoming defects / hour distributions
+                       ('remediation_distributions', visualize_remediation_distributions, (defect_type_dict, plot_dict, remediation_distributions, trial_aggregate))] # remediation time distributions
+        if args.headless == 'True':
+            render_figures(figure_jobs, args.path_figures, args.workers)
+        else:
+            show_figures(figure_jobs)
\ No newline at end of file
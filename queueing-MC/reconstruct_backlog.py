@@ -0,0 +1,170 @@
+import warnings
+import numpy as np
+
+
+def reconstruct_backlog(comparison_dict):
+    """
+    Reconstructs the backlog of every trial whose defect log is in comparison_dict, independently of any plotting.
+
+    Args
+        :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations
+    Returns
+        :times (dict): event times, "on the hour" and remediation times in order (per trial, Numpy array)
+        :backlog (dict): backlog right after each event (per trial, Numpy array)
+    """
+    times = {}
+    backlog = {}
+    for trial in comparison_dict.keys():
+        if 'defect_log' in comparison_dict[trial]: # dropped when aggregating, unless kept
+            times[trial], backlog[trial] = backlog_trace(comparison_dict[trial]['defect_log'], comparison_dict[trial]['t_end'])
+    return times, backlog
+
+
+def reconstruct_error_bound(comparison_dict, t_end, resolution):
+    """
+    Bound on the error of the hourly backlog caused by quantized remediation times, across the trials whose defect log is
+    in comparison_dict. Each trial moves by at most its own bound, so does any quantile or mean across trials.
+
+    Args
+        :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations
+        :t_end (int): number of hours
+        :resolution (float): quantization step of the remediation times, in hours (0 = no quantization)
+    Returns
+        :error_bound (Numpy array): bound on the error of the average backlog over each hour [h-1, h)
+    """
+    return np.max([backlog_error_bound(comparison_dict[trial]['defect_log'], t_end, resolution)
+                   for trial in comparison_dict.keys() if 'defect_log' in comparison_dict[trial]], axis=0, initial=0)
+
+
+def backlog_bands(comparison_dict, quantiles=(0, 0.25, 0.5, 0.75, 1), resolution=0):
+    """
+    Quantile bands of the hourly backlog across the trials whose defect log is in comparison_dict.
+
+    Args
+        :comparison_dict (dict): nested dictionary wrapping main results and defect log for all simulations
+        :quantiles (tuple): quantiles of the bands, between 0 and 1
+        :resolution (float): quantization step of the remediation times, in hours (0 = no quantization)
+    Returns
+        :bands_df (Polars DataFrame): one row per hour, with the mean and one column per quantile (min, max, median, pNN), plus error_bound if resolution > 0
+    """
+    times, backlog = reconstruct_backlog(comparison_dict)
+    t_end = max(int(comparison_dict[trial]['t_end']) for trial in times.keys())
+    bands_df = quantile_bands(hourly_backlog(times, backlog, t_end), quantiles)
+    if resolution > 0:
+        bands_df = bands_df.with_columns(error_bound=reconstruct_error_bound(comparison_dict, t_end, resolution))
+    return bands_df
+
+
+def backlog_trace(defect_log, t_end):
+    """
+    Backlog of a single trial (defects created and not remediated yet) as a cumulative event series, without rescanning the defects for each hour:
+    the defects created "on the hour" are counted per hour with np.bincount, each remediation takes one off, and the
+    steps are summed in time order (an hour comes before a remediation at the same time). For a defect log whose closed
+    history was moved to cold storage, the series starts at its history_end, with the defects still open then.
+
+    Args
+        :defect_log (DefectStore): simulation defect log of the trial
+        :t_end (float): simulation end time of the trial
+    Returns
+        :times (Numpy array): event times, hours history_end (0 unless in cold storage) to t_end and remediation times, in time order
+        :backlog (Numpy array): backlog right after each event
+    """
+    t_first = int(defect_log.history_end)
+    hours = np.arange(t_first, int(t_end) + 1)
+    end = defect_log['processing_end_time']
+    end = end[~np.isnan(end)]
+    created = np.maximum(defect_log['t_created'].astype(np.int64) - t_first, 0) # open at history_end, counted from then
+    arrivals = np.bincount(created, minlength=len(hours))[:len(hours)]
+    times = np.concatenate((hours, end))
+    steps = np.concatenate((arrivals, np.full(len(end), -1, dtype=np.int64)))
+    order = np.argsort(times, kind='stable') # stable, so the hours (first) stay ahead of remediations at the same time
+    return times[order], np.cumsum(steps[order])
+
+
+def backlog_error_bound(defect_log, t_end, resolution):
+    """
+    Bound on the error of the hourly backlog of a single trial caused by quantized remediation times. A quantized time is
+    off by at most resolution/2 (resolution when rounded up to the first multiple), and the completion of a defect
+    inherits the errors of the defects treated back-to-back before it in the same processing queue. A completion off by
+    delta moves the average backlog of the hours within delta of it by at most min(delta, 1). The bound holds for the
+    same order of remediation: a completion moved past an arrival could change which defect is pulled next.
+
+    Args
+        :defect_log (DefectStore): simulation defect log of the trial
+        :t_end (int): number of hours
+        :resolution (float): quantization step of the remediation times, in hours (0 = no quantization)
+    Returns
+        :error_bound (Numpy array): bound on the error of the average backlog over each hour [h-1, h)
+    """
+    error_bound = np.zeros(t_end + 1)
+    start, remediation_time = defect_log['processing_start_time'], defect_log['remediation_time']
+    rows = np.flatnonzero(~np.isnan(start) & (remediation_time > 0)) # defects that complete, or would after the horizon
+    if resolution == 0 or len(rows) == 0:
+        return error_bound[:t_end]
+    rows = rows[np.argsort(start[rows], kind='stable')]
+    end = start[rows] + remediation_time[rows]
+    lane = defect_log['queue_index'][rows]
+    delta = np.where(remediation_time[rows] > 1.5 * resolution, resolution / 2, resolution)
+    chain_error = {} # (processing queue, completion time) -> largest error carried to that completion
+    for index in range(len(rows)):
+        ### the defect started when another one of its processing queue completed, it carries that error along
+        delta[index] += chain_error.get((lane[index], start[rows[index]]), 0.0)
+        key = (lane[index], end[index])
+        chain_error[key] = max(chain_error.get(key, 0.0), delta[index])
+    first = np.clip(np.floor(end - delta), 0, t_end).astype(np.int64)
+    last = np.clip(np.floor(end + delta) + 1, 0, t_end).astype(np.int64)
+    np.add.at(error_bound, first, np.minimum(delta, 1))
+    np.add.at(error_bound, last, -np.minimum(delta, 1))
+    return np.cumsum(error_bound)[:t_end]
+
+
+def hourly_backlog(times, backlog, t_end):
+    """
+    Time-averaged backlog of each trial over each hour [h-1, h), as a trials x hours matrix. The backlog holds its value
+    between events, so its integral up to every hour comes from a single np.searchsorted pass over the event times.
+    Hours before the first event of a trial (closed history in cold storage) are NaN.
+
+    Args
+        :times (dict): event times (per trial, Numpy array), as returned by reconstruct_backlog
+        :backlog (dict): backlog right after each event (per trial, Numpy array), as returned by reconstruct_backlog
+        :t_end (int): number of hours
+    Returns
+        :hourly_matrix (Numpy array): average backlog per trial (rows, in the order of times) and hour (columns)
+    """
+    hours = np.arange(t_end + 1)
+    hourly_matrix = np.zeros((len(times), t_end))
+    for row, trial in enumerate(times.keys()):
+        t, b = times[trial], backlog[trial]
+        area = np.concatenate(([0.0], np.cumsum(b[:-1] * np.diff(t)))) # integral of the backlog up to each event
+        last = np.searchsorted(t, hours, side='right') - 1               # last event at or before each hour
+        hourly_matrix[row] = np.diff(area[last] + b[last] * (hours - t[last]))
+        hourly_matrix[row, :int(t[0])] = np.nan
+    return hourly_matrix
+
+
+def quantile_bands(hourly_matrix, quantiles=(0, 0.25, 0.5, 0.75, 1)):
+    """
+    Quantile bands of the hourly backlog across trials, one vectorized np.nanquantile along the trials axis (NaN, hours
+    in cold storage, left out).
+
+    Args
+        :hourly_matrix (Numpy array): average backlog per trial (rows) and hour (columns)
+        :quantiles (tuple): quantiles of the bands, between 0 and 1
+    Returns
+        :bands_df (Polars DataFrame): one row per hour, with the mean and one column per quantile (min, max, median, pNN)
+    """
+    import polars as pl
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # hours in cold storage for every trial stay NaN
+        bands = np.nanquantile(hourly_matrix, quantiles, axis=0)
+        mean = np.nanmean(hourly_matrix, axis=0)
+    return pl.DataFrame({'hour': np.arange(1, hourly_matrix.shape[1] + 1),
+                         'mean': mean,
+                         **{band_name(q): band for q, band in zip(quantiles, bands)}})
+
+
+def band_name(q):
+    """
+    Column name of a quantile band: min, max, median or pNN.
+    """
+    return 'min' if q == 0 else 'max' if q == 1 else 'median' if q == 0.5 else f'p{100*q:g}'
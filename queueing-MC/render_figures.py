@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+
+def render_figures(figure_jobs, output_dir, workers=1):
+    """
+    Renders figures headless (Agg backend) as PNG files in output_dir, spread across worker processes. A figure is only
+    rendered again when the content hash of its input data differs from the one of its last PNG (kept in
+    figure_hashes.json in output_dir, with the path of that PNG).
+
+    Args
+        :figure_jobs (list): (name, plot function returning the figure, tuple of input data) per figure
+        :output_dir (str): directory of the PNG files
+        :workers (int): number of worker processes (1 = serial)
+    Returns
+        :paths (dict): path of the PNG file (per figure name)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'figure_hashes.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+    paths = {}
+    pending = []
+    for name, plot_function, data in figure_jobs:
+        digest = content_hash(plot_function, data)
+        entry = manifest.get(name)
+        if isinstance(entry, dict) and entry['hash'] == digest and os.path.exists(entry['path']): # plain hashes of earlier versions are rendered again
+            paths[name] = entry['path'] # last PNG is still up to date
+            continue
+        paths[name] = os.path.join(output_dir, f'{name}.png')
+        manifest[name] = {'hash': digest, 'path': paths[name]}
+        pending.append((paths[name], plot_function, data))
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            list(executor.map(render_figure, *zip(*pending)))
+    else:
+        for path, plot_function, data in pending:
+            render_figure(path, plot_function, data)
+
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return paths
+
+
+def render_figure(path, plot_function, data):
+    """
+    Draws a single figure with the Agg backend and saves it as a PNG file.
+
+    Args
+        :path (str): path of the PNG file
+        :plot_function (function): plot function returning the figure (module level, so it can be sent to a worker)
+        :data (tuple): input data of the plot function
+    Returns
+        :path (str): path of the PNG file
+    """
+    import matplotlib
+    matplotlib.use('Agg') # non-interactive, never blocks on a window
+    import matplotlib.pyplot as plt
+    fig = plot_function(*data)
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+    return path
+
+
+def show_figures(figure_jobs):
+    """
+    Draws the figures and shows them all at once in interactive windows.
+
+    Args
+        :figure_jobs (list): (name, plot function returning the figure, tuple of input data) per figure
+    """
+    import matplotlib.pyplot as plt
+    for name, plot_function, data in figure_jobs:
+        plot_function(*data)
+    plt.show()
+
+
+def content_hash(plot_function, data):
+    """
+    SHA-256 of the plot function's name and of its pickled input data.
+
+    Args
+        :plot_function (function): plot function returning the figure
+        :data (tuple): input data of the plot function
+    Returns
+        :digest (str): hexadecimal digest
+    """
+    digest = hashlib.sha256(f'{plot_function.__module__}.{plot_function.__qualname__}'.encode())
+    digest.update(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
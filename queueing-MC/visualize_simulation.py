@@ -1,82 +1,32 @@
 import matplotlib.pyplot as plt
-from itertools import count
 import numpy as np
+from reconstruct_backlog import backlog_trace, reconstruct_backlog, reconstruct_error_bound, hourly_backlog, quantile_bands
 
 
-def visualize_simulation(comparison_dict):
+def visualize_simulation(comparison_dict, resolution=0):
     #### VISUALIZATION ####
-    defects_created = {}
-    defects_remediated = {}
-    list_remediated = {}
-    list_remediated_forplot = {}
-    times = {}
-    times_forplot = {}
-    backlog = {}
-
     #### Reconstructing the backlog - defects generated and remediated ####
-    for trial in comparison_dict.keys():
-        t_end = int(comparison_dict[trial]['t_end'])
-        hours = list(range(t_end+1))
-        initial_backlog = sum([1 for key in comparison_dict[trial]['defect_log'].keys() if comparison_dict[trial]['defect_log'][key]['t_created'] == 0])
-        defects_created[trial] = {}
-        defects_remediated[trial] = {}
-        for key in comparison_dict[trial]['defect_log'].keys():
-            defects_created[trial][key] = comparison_dict[trial]['defect_log'][key]['t_created']
-            try:
-                defects_remediated[trial][key] = comparison_dict[trial]['defect_log'][key]['processing_end_time']
-            except KeyError:
-                pass
-
-        list_remediated[trial] = [defects_remediated[trial][key] for key in defects_remediated[trial].keys()]
-        list_remediated_forplot[trial] = [defects_remediated[trial][key][0] for key in defects_remediated[trial].keys()] # remove the np.ndarray for the values to be plotted
-        times[trial] = sorted(list(range(t_end+1)) + list_remediated[trial]) # keep np.ndarray to distinguish between "on the hour" generated and remediated
-        times_forplot[trial] = sorted(list(range(t_end+1)) + list_remediated_forplot[trial])
-        backlog[trial] = []
-
-        niter = count(0)
-        for t in times[trial]:
-            if t == 0:
-                backlog[trial].append(initial_backlog)
-            elif type(t) == np.ndarray:
-                value = backlog[trial][next(niter)] - 1
-                backlog[trial].append(value)
-            elif t in list(defects_created[trial].values()):
-                res = sum(int(value) == t for value in defects_created[trial].values())
-                value = backlog[trial][next(niter)] + res
-                backlog[trial].append(value)
-            else:
-                backlog[trial].append(backlog[trial][next(niter)])
-
-    backlog_max = max(i for v in backlog.values() for i in v)
-    backlog_min = min(i for v in backlog.values() for i in v)
-
-    visualize_boxplot(hours, times_forplot, backlog)
+    times, backlog = reconstruct_backlog(comparison_dict)
+    t_end = max(int(comparison_dict[trial]['t_end']) for trial in times.keys())
+    hours = list(range(t_end+1))
+    hourly_matrix = hourly_backlog(times, backlog, t_end) # trials x hours
+
+    error_bound = reconstruct_error_bound(comparison_dict, t_end, resolution) if resolution > 0 else None # quantized remediation times
+
+    return visualize_boxplot(hours, times, backlog, hourly_matrix, error_bound)
 
     
-def visualize_boxplot(hours, times_forplot, backlog):
+def visualize_boxplot(hours, times, backlog, hourly_matrix, error_bound=None):
     #### Constructing and visualizing the box plots per unit of time ####
-    hourly_stats = {}
-    median_curve = []
-    min_curve = []
-    max_curve = []
-
-    for hour in hours[:-1]:
-        hourly_stats['hour{0}'.format(hour+1)] = []
-        for trial in times_forplot.keys():
-            starting = times_forplot[trial].index(hours[hour])
-            stopping = times_forplot[trial].index(hours[hour+1])
-            # hourly_stats['hour{0}'.format(hour+1)] = hourly_stats['hour{0}'.format(hour+1)] + backlog[trial][starting:stopping]
-            hourly_stats['hour{0}'.format(hour+1)] += backlog[trial][starting:stopping]
-        median_curve.append(np.percentile(hourly_stats['hour{0}'.format(hour+1)],[50])[0])
-        min_curve.append(min(hourly_stats['hour{0}'.format(hour+1)]))
-        max_curve.append(max(hourly_stats['hour{0}'.format(hour+1)]))
+    bands = quantile_bands(hourly_matrix)
+    median_curve = bands['median'].to_numpy()
 
     #### "Clean" = backlog < 20% of initial    
-    colors = ['#2348FF' if value < max(median_curve)*0.2 else '#C21445' for value in median_curve]
+    colors = ['#2348FF' if value < np.nanmax(median_curve)*0.2 else '#C21445' for value in median_curve]
 
     fig, ax = plt.subplots(1, 1, figsize=(10,4))
 
-    bplot = ax.boxplot(list(hourly_stats.values()),
+    bplot = ax.boxplot([column[~np.isnan(column)] for column in hourly_matrix.T], # NaN: hours in cold storage
                        labels=hours[1:],
                        patch_artist=True,
                        sym='',
@@ -84,20 +34,55 @@ def visualize_boxplot(hours, times_forplot, backlog):
     for patch, color in zip(bplot['boxes'], colors):
         patch.set_facecolor(color)
 
-    for trial in times_forplot.keys():
-        ax.plot(times_forplot[trial], backlog[trial], ':', linewidth=0.5, color='navy', alpha=0.5) # plotting raw signals
+    for trial in times.keys():
+        ax.plot(times[trial], backlog[trial], ':', linewidth=0.5, color='navy', alpha=0.5) # plotting raw signals
     
     csfont = {'fontname':'Arial'}
-    # ax.plot(hours[1:], max_curve, 'r', linewidth=0.75, alpha=0.3)
+    # ax.plot(hours[1:], bands['max'], 'r', linewidth=0.75, alpha=0.3)
     ax.plot(hours[1:], median_curve, 'k', linewidth=1, alpha=0.5, label='median "on the hour"')
-    # ax.plot(hours[1:], min_curve, 'b', linewidth=0.75, alpha=0.3)
-    # ax.fill_between(hours[1:], min_curve, max_curve, color='purple', alpha=0.1)
+    if error_bound is not None:
+        ax.fill_between(hours[1:], np.maximum(median_curve - error_bound, 0), median_curve + error_bound, color='k', alpha=0.15, label='error bound (quantized remediation times)')
+    # ax.plot(hours[1:], bands['min'], 'b', linewidth=0.75, alpha=0.3)
+    # ax.fill_between(hours[1:], bands['min'], bands['max'], color='purple', alpha=0.1)
     ax.set_xticks(hours[::10], labels=hours[::10])
-    ax.set_xlim(0, max(times_forplot[trial]))
+    ax.set_xlim(0, max(times[trial][-1] for trial in times.keys()))
     ax.set_xlabel('times (hrs)', fontsize=14, **csfont)
     ax.set_ylabel('defects backlog\n(average/hour)', fontsize=14, **csfont)
     # ax.legend()
-    plt.show()
+    return fig
+
+
+def visualize_aggregate(trial_aggregate, comparison_dict):
+    #### Box plots per unit of time from the streaming aggregate, raw signals of the trials whose defect log was kept ####
+    stats = trial_aggregate.boxplot_stats()
+    hours = list(range(trial_aggregate.backlog_hist.shape[0] + 1))
+    positions = [stat['label'] for stat in stats]
+    median_curve = [stat['med'] for stat in stats]
+
+    #### "Clean" = backlog < 20% of initial    
+    colors = ['#2348FF' if value < max(median_curve)*0.2 else '#C21445' for value in median_curve]
+
+    fig, ax = plt.subplots(1, 1, figsize=(10,4))
+
+    bplot = ax.bxp(stats, positions=positions, patch_artist=True, showfliers=False) # each box plot at time_step corresponds to the data from [time_step-1, time_step)
+    for patch, color in zip(bplot['boxes'], colors):
+        patch.set_facecolor(color)
+
+    for trial in comparison_dict.keys():
+        if 'defect_log' in comparison_dict[trial]:
+            times, backlog = backlog_trace(comparison_dict[trial]['defect_log'], comparison_dict[trial]['t_end'])
+            ax.plot(times, backlog, ':', linewidth=0.5, color='navy', alpha=0.5) # plotting raw signals
+
+    csfont = {'fontname':'Arial'}
+    ax.plot(positions, median_curve, 'k', linewidth=1, alpha=0.5, label='median "on the hour"')
+    if trial_aggregate.resolution > 0:
+        error_bound = trial_aggregate.error_bound[np.array(positions, dtype=int) - 1]
+        ax.fill_between(positions, np.maximum(np.array(median_curve) - error_bound, 0), np.array(median_curve) + error_bound, color='k', alpha=0.15, label='error bound (quantized remediation times)')
+    ax.set_xticks(hours[::10], labels=hours[::10])
+    ax.set_xlim(0, hours[-1])
+    ax.set_xlabel('times (hrs)', fontsize=14, **csfont)
+    ax.set_ylabel(f'defects backlog\n({len(trial_aggregate)} trials)', fontsize=14, **csfont)
+    return fig
 
 
 def visualize_generation_distributions(defect_type_dict, incoming_defects_dict, generation_distributions):
@@ -143,29 +128,39 @@ def visualize_generation_distributions(defect_type_dict, incoming_defects_dict,
     else:
         axs.set_ylabel('density', fontsize=14, **csfont)
     fig.text(0.5, 0, '# incoming defects per hour', ha='center', fontsize=14, **csfont)
-    plt.show()
+    return fig
 
 
-def visualize_remediation_distributions(defect_type_dict, comparison_dict, remediation_distributions):
+def visualize_remediation_distributions(defect_type_dict, comparison_dict, remediation_distributions, trial_aggregate=None):
     incoming_remediations = {key: [] for key in defect_type_dict.keys()}
-
-    for trial in comparison_dict.keys():
-        for key in comparison_dict[trial]['defect_log'].keys():
-            incoming_remediations[comparison_dict[trial]['defect_log'][key]['defect_type']].append(comparison_dict[trial]['defect_log'][key]['remediation_time'][0])
+    weights = {key: None for key in defect_type_dict.keys()}
+
+    if trial_aggregate is not None:
+        ### remediation time histograms of the streaming aggregate, as weighted bin middles
+        middles = (np.arange(trial_aggregate.remediation_hist.shape[1]) + 0.5) * trial_aggregate.bin_width
+        for type_code, key in enumerate(trial_aggregate.defect_types):
+            incoming_remediations[key] = middles
+            weights[key] = trial_aggregate.remediation_hist[type_code]
+    else:
+        for trial in comparison_dict.keys():
+            defect_log = comparison_dict[trial]['defect_log']
+            for type_code, key in enumerate(defect_log.defect_types):
+                incoming_remediations[key] += defect_log['remediation_time'][defect_log['type_code'] == type_code].tolist()
+    samples = {key: len(incoming_remediations[key]) if weights[key] is None else int(weights[key].sum()) for key in defect_type_dict.keys()}
 
     csfont = {'fontname':'Arial'}
     
     if len(defect_type_dict.keys()) > 1:
         fig, axs = plt.subplots (1, len(defect_type_dict.keys()), figsize=(16,4))
         for index, value in enumerate(defect_type_dict.keys()):
-            axs[index].hist(incoming_remediations[value], label=f'{len(incoming_remediations[value])} samples', color='#2348FF', alpha=0.2, edgecolor='black', linewidth=1.5, density=True)
+            axs[index].hist(incoming_remediations[value], weights=weights[value], label=f'{samples[value]} samples', color='#2348FF', alpha=0.2, edgecolor='black', linewidth=1.5, density=True)
             axs[index].hist(remediation_distributions[value], label=f"theory, α={defect_type_dict[value]['skewness_outgoing']}", histtype='step', linewidth=2, color='#2348FF', density=True)
             axs[index].set_title(f'Type {value[-1]}', loc='left', fontsize=14, **csfont)
             axs[index].legend(loc='upper right', bbox_to_anchor=(1.02, 1.13), fontsize='x-small')
     else:
         fig, axs = plt.subplots (1, len(defect_type_dict.keys()), figsize=(8,4))
         for key in defect_type_dict.keys():
-            axs.hist(incoming_remediations[key], label=f'{len(incoming_remediations[key])} samples', color='#2348FF', alpha=0.2, edgecolor='black', linewidth=1.5, density=True)
+            axs.hist(incoming_remediations[key], weights=weights[key], label=f'{samples[key]} samples', color='#2348FF', alpha=0.2, edgecolor='black', linewidth=1.5, density=True)
             axs.hist(remediation_distributions[key], label=f"theory, α={defect_type_dict[key]['skewness_outgoing']}", histtype='step', linewidth=2, color='#2348FF', density=True)
             axs.set_title(f'Type {key[-1]}', loc='left', fontsize=14, **csfont)
             axs.legend(loc='upper right', bbox_to_anchor=(1.02, 1.13), fontsize='x-small')
@@ -175,4 +170,4 @@ def visualize_remediation_distributions(defect_type_dict, comparison_dict, remed
     else:
         axs.set_ylabel('density', fontsize=14, **csfont)
     fig.text(0.5, 0, 'remediation time (hrs)', ha='center', fontsize=14, **csfont)
-    plt.show()
\ No newline at end of file
+    return fig
\ No newline at end of file
@@ -1,28 +1,32 @@
 import polars as pl
 import numpy as np
-import matplotlib.pyplot as plt
 import datetime
 from utils.VisualizationFunctions import VisualizationFunctions
+from utils.FigureRenderer import FigureRenderer
 
 
 class BuildHistories:
-    def __init__(self, control_type, log_df, sub_deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict):
+    def __init__(self, control_type, log_df, sub_deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict, figure_renderer=None, incremental=False):
         self.control_type = control_type
+        self.incremental = incremental # log_df only holds the rows past the previous run
         # self.log_df = log_df
-        self.sub_log_df_inc = log_df.filter(pl.col('Control_Type') == self.control_type, pl.col('State') == "new")
-        self.sub_log_df_out = log_df.filter(pl.col('Control_Type') == self.control_type, pl.col('State') == "closed")
+        ### incoming and outgoing rows and first date in logs, collected together from the (lazy) log in streaming mode
+        self.sub_log_df_inc, self.sub_log_df_out, first_date = pl.collect_all([log_df.lazy().filter(pl.col('Control_Type') == self.control_type, pl.col('State') == "new"),
+                                                                               log_df.lazy().filter(pl.col('Control_Type') == self.control_type, pl.col('State') == "closed"),
+                                                                               log_df.lazy().select(pl.col('Date').min())],
+                                                                              engine='streaming')
         self.sub_deltas_df = sub_deltas_df
         self.incoming_dict = incoming_dict
         self.outgoing_dict = outgoing_dict
         self.timedeltas_dict = timedeltas_dict
         self.empirical_dict = empirical_dict
-        self.VisualizationFunctions = VisualizationFunctions()
+        self.figure_renderer = figure_renderer if figure_renderer is not None else FigureRenderer()
 
         # try:
         #     start_date = datetime.datetime.strptime(
         #         list(self.incoming_dict[self.control_type].keys())[-1], "%Y-%m-%d").date() # retrieve last date in timedeltas_dict
         # except IndexError:    
-        start_date = log_df.sort(pl.col("Date"), descending=False)['Date'][0] # take first date in logs
+        start_date = first_date['Date'][0] # take first date in logs
         end_date = datetime.date(2025, 6, 20) # to be replaced with .today() for real data
         self.days = pl.date_range(start_date,end_date,datetime.timedelta(days=1),eager=True) # list of every day between oldest and now
 
@@ -35,19 +39,12 @@ class BuildHistories:
         """
         Updates empirical log data delta histograms (per defect type)
         """
-        fig, axs = plt.subplots (1, 4, figsize=(16,4))
-        deltas = ['Delta_New_Assign', 'Delta_Assign_InProgress', 'Delta_InProgress_Closed', 'Delta_New_Closed']
-        for index in range(4):
-            data = self.empirical_dict[self.control_type][deltas[index].lower()]
-            fig, axs = self.VisualizationFunctions.visualize_histograms_theory(fig,
-                                                                               axs,
-                                                                               index,
-                                                                               data,
-                                                                               label=None,
-                                                                               title=deltas[index],
-                                                                               color='#C21445')
-        plt.savefig(f'figures/{self.control_type}_delta_histograms_{datetime.date.today()}.png', bbox_inches='tight')
-        plt.close()
+        deltas = ['delta_new_assign', 'delta_assign_inprogress', 'delta_inprogress_closed', 'delta_new_closed']
+        self.figure_renderer.submit(f'{self.control_type}_delta_histograms',
+                                    f'{self.control_type}_delta_histograms_{datetime.date.today()}.png',
+                                    plot_delta_histograms,
+                                    self.control_type,
+                                    {delta: self.histogram_samples(delta) for delta in deltas})
 
     def update_incoming(self):
         """
@@ -57,14 +54,7 @@ class BuildHistories:
             :incoming_dict (dict): tracks incoming defects per hour (per defect type)
             :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type)
         """
-        empirical_list = []
-        # for day in self.sub_log_df_inc["Date"].unique():
-        for day in self.days:
-            sub_log_df_inc_date = self.sub_log_df_inc.filter(pl.col('Date') == day)['Hour'].value_counts()
-            incoming_defects = [sub_log_df_inc_date.filter(pl.col('Hour') == i)['count'][0] if i in list(sub_log_df_inc_date.select('Hour'))[0] else 0 for i in range(24)]
-            self.incoming_dict[self.control_type].update({day.strftime('%Y-%m-%d'): incoming_defects})
-            empirical_list = empirical_list + self.incoming_dict[self.control_type][day.strftime('%Y-%m-%d')]
-        self.empirical_dict[self.control_type]['incoming_per_hour'] = empirical_list
+        self.store_counts(self.hourly_counts(self.sub_log_df_inc), self.incoming_dict, 'incoming_per_hour')
         return self.incoming_dict, self.empirical_dict
     
     def update_outgoing(self):
@@ -75,40 +65,53 @@ class BuildHistories:
             :outgoing_dict (dict): tracks outgoing defects per hour (per defect type)
             :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type)
         """
-        empirical_list = []
-        for day in self.days:
-            sub_log_df_out_date = self.sub_log_df_out.filter(pl.col('Date') == day)['Hour'].value_counts()
-            outgoing_defects = [sub_log_df_out_date.filter(pl.col('Hour') == i)['count'][0] if i in list(sub_log_df_out_date.select('Hour'))[0] else 0 for i in range(24)]
-            self.outgoing_dict[self.control_type].update({day.strftime('%Y-%m-%d'): outgoing_defects})
-            empirical_list = empirical_list + self.outgoing_dict[self.control_type][day.strftime('%Y-%m-%d')]
-        self.empirical_dict[self.control_type]['outgoing_per_hour'] = empirical_list
+        self.store_counts(self.hourly_counts(self.sub_log_df_out), self.outgoing_dict, 'outgoing_per_hour')
         return self.outgoing_dict, self.empirical_dict
+
+    def hourly_counts(self, sub_log_df):
+        """
+        Counts the log rows per day and hour, in one group-by on (Date, Hour) joined to the dense calendar of self.days
+        (hours without rows counted as 0)
+
+        Args
+            :sub_log_df (Polars DataFrame): log rows of the defect type in a single state (e.g. 'new')
+        Returns
+            :counts (Numpy array): log rows per day (rows, in the order of self.days) and hour (24 columns)
+        """
+        calendar = pl.DataFrame({'Date': self.days}).join(pl.DataFrame({'Hour': pl.Series(range(24), dtype=sub_log_df.schema['Hour'])}), how='cross')
+        counts = calendar.join(sub_log_df.group_by('Date', 'Hour').len(), on=['Date', 'Hour'], how='left').sort('Date', 'Hour')
+        return counts['len'].fill_null(0).to_numpy().reshape(len(self.days), 24)
+
+    def store_counts(self, counts, counts_dict, key):
+        """
+        Stores the counts per hour of each day in counts_dict, and the counts of every hour as the empirical samples
+        of key in empirical_dict (per defect type)
+
+        Args
+            :counts (Numpy array): log rows per day (rows, in the order of self.days) and hour (24 columns)
+            :counts_dict (dict): tracks incoming or outgoing defects per hour (per defect type), updated in place
+            :key (str): empirical samples in empirical_dict ('incoming_per_hour' or 'outgoing_per_hour')
+        """
+        days = self.days.dt.strftime('%Y-%m-%d').to_list()
+        if self.incremental:
+            ### days partly counted by the previous run
+            counts = counts + np.array([counts_dict[self.control_type].get(day, [0]*24) for day in days], dtype=np.int64).reshape(-1, 24)
+        counts_dict[self.control_type].update(zip(days, counts.tolist()))
+        if self.incremental:
+            ### every day counted so far, not only those of this run
+            counts = np.array([counts_dict[self.control_type][day] for day in sorted(counts_dict[self.control_type].keys())], dtype=np.int64)
+        self.empirical_dict[self.control_type][key] = counts.ravel().tolist()
     
     def update_incoming_outgoing_histograms(self):
         """
         Updates empirical log data incoming + outgoing histograms (per defect type)
         """
-        fig, axs = plt.subplots (1, 2, figsize=(16,4))
-        # incoming_per_hour histogram
-        data_incoming = np.array(self.empirical_dict[self.control_type]['incoming_per_hour'])
-        fig, axs = self.VisualizationFunctions.visualize_histograms_theory(fig,
-                                                                           axs,
-                                                                           0,
-                                                                           data_incoming,
-                                                                           label='incoming',
-                                                                           title=f'{self.control_type} incoming [/hr]',
-                                                                           color='#C21445')
-        # outgoing_per_hour histogram
-        data_outgoing = np.array(self.empirical_dict[self.control_type]['outgoing_per_hour'])
-        fig, axs = self.VisualizationFunctions.visualize_histograms_theory(fig,
-                                                                           axs,
-                                                                           1,
-                                                                           data_outgoing,
-                                                                           label='outgoing',
-                                                                           title=f'{self.control_type} outgoing [/hr]',
-                                                                           color='#C21445')
-        plt.savefig(f'figures/{self.control_type}_histograms_{datetime.date.today()}.png', bbox_inches='tight')
-        plt.close()
+        self.figure_renderer.submit(f'{self.control_type}_histograms',
+                                    f'{self.control_type}_histograms_{datetime.date.today()}.png',
+                                    plot_incoming_outgoing_histograms,
+                                    self.control_type,
+                                    self.histogram_samples('incoming_per_hour'),
+                                    self.histogram_samples('outgoing_per_hour'))
 
 
     def update_timedeltas(self):
@@ -123,40 +126,128 @@ class BuildHistories:
 
         Dates = ['Date_Assign', 'Date_InProgress', 'Date_Closed', 'Date_Closed']
         Cols = ['Delta_New_Assign', 'Delta_Assign_InProgress', 'Delta_InProgress_Closed', 'Delta_New_Closed']
+        calendar = pl.DataFrame({'Date': self.days})
+        days = self.days.dt.strftime('%Y-%m-%d').to_list()
         for index in range(4):
-            for day in self.days:
-                mean_value = self.sub_deltas_df.filter(pl.col(Dates[index]) == day).mean()[Cols[index]][0]
-                # mean_assign_inprogress = self.sub_deltas_df.filter(pl.col('Date_InProgress') == day).mean()['Delta_Assign_InProgress'][0]
-                # mean_inprogress_closed = self.sub_deltas_df.filter(pl.col('Date_Closed') == day).mean()['Delta_InProgress_Closed'][0]
-                # mean_new_closed = self.sub_deltas_df.filter(pl.col('Date_Closed') == day).mean()['Delta_New_Closed'][0]
-                if mean_value is None:
-                    try:
-                        self.timedeltas_dict[self.control_type][Cols[index].lower()][day.strftime('%Y-%m-%d')] = self.timedeltas_dict[self.control_type][Cols[index].lower()][(day - datetime.timedelta(days=1)).strftime('%Y-%m-%d')]
-                    except KeyError:
-                        self.timedeltas_dict[self.control_type][Cols[index].lower()][day.strftime('%Y-%m-%d')] = 0
-                else:
-                    self.timedeltas_dict[self.control_type][Cols[index].lower()][day.strftime('%Y-%m-%d')] = np.round(mean_value, 2)
+            timeline = self.timedeltas_dict[self.control_type][Cols[index].lower()]
+            ### mean of each day, days without defects carry the previous day forward
+            daily_means = self.sub_deltas_df.group_by(pl.col(Dates[index]).alias('Date')).agg(pl.col(Cols[index]).mean())
+            daily_means = calendar.join(daily_means, on='Date', how='left').sort('Date')[Cols[index]].fill_null(strategy='forward')
+            ### days before the first mean: last value of the previous run, else 0
+            previous = timeline.get((self.days[0] - datetime.timedelta(days=1)).strftime('%Y-%m-%d'), 0) if len(days) > 0 else 0
+            timeline.update(zip(days, [previous if missing else mean for missing, mean in zip(daily_means.is_null().to_list(), np.round(daily_means.to_numpy(), 2).tolist())]))
 
     def update_timeline_figures(self):
         """
         Updates timeline figures tracking evolution of time deltas (per defect type)
         """
-        fig, axs = plt.subplots(1, 4, figsize=(16, 4))
-        deltas = ['Delta_New_Assign', 'Delta_Assign_InProgress', 'Delta_InProgress_Closed', 'Delta_New_Closed']
-        ylabels = ['time (hrs)', None, None, None]
-        for index in range(4):
-            # xdata = range(1,len(self.sub_deltas_df.select(deltas[index])) + 1)
-            # ydata = self.sub_deltas_df.select(deltas[index])
-            xdata = [datetime.datetime.strptime(key, "%Y-%m-%d").date() for key in self.timedeltas_dict[self.control_type][deltas[index].lower()].keys()]
-            ydata = list(self.timedeltas_dict[self.control_type][deltas[index].lower()].values())
-            fig, axs = self.VisualizationFunctions.visualize_timeline(fig,
-                                                                      axs,
-                                                                      index,
-                                                                      xdata,
-                                                                      ydata,
-                                                                      ylabel=ylabels[index],
-                                                                      title=deltas[index])
-    
-        fig.text(0.5, 0.95, f'{self.control_type}', ha='center', fontsize=12)
-        plt.savefig(f'figures/{self.control_type}_fig_{datetime.date.today()}.png', bbox_inches='tight')
-        plt.close()
\ No newline at end of file
+        self.figure_renderer.submit(f'{self.control_type}_fig',
+                                    f'{self.control_type}_fig_{datetime.date.today()}.png',
+                                    plot_timeline_figures,
+                                    self.control_type,
+                                    {delta: (list(timeline.keys()), np.array(list(timeline.values()), dtype=float))
+                                     for delta, timeline in self.timedeltas_dict[self.control_type].items()})
+
+    def histogram_samples(self, key):
+        """
+        Empirical samples of a histogram, sorted: the order of the samples does not change the histogram, so that the
+        figure is only rendered again when the samples themselves change.
+
+        Args
+            :key (str): histogram in empirical_dict (e.g. 'incoming_per_hour')
+        Returns
+            :samples (Numpy array): sorted samples
+        """
+        return np.sort(np.array(self.empirical_dict[self.control_type][key], dtype=float))
+
+
+#### FIGURES (module level, so that FigureRenderer can draw them in worker processes) ####
+def plot_delta_histograms(control_type, samples):
+    """
+    Draws the empirical log data delta histograms of a defect type.
+
+    Args
+        :control_type (str): defect's control type
+        :samples (dict): empirical samples (per delta)
+    Returns
+        :fig (matplotlib Figure): figure
+    """
+    import matplotlib.pyplot as plt
+    visualization_functions = VisualizationFunctions()
+    fig, axs = plt.subplots (1, 4, figsize=(16,4))
+    deltas = ['Delta_New_Assign', 'Delta_Assign_InProgress', 'Delta_InProgress_Closed', 'Delta_New_Closed']
+    for index in range(4):
+        data = samples[deltas[index].lower()]
+        fig, axs = visualization_functions.visualize_histograms_theory(fig,
+                                                                       axs,
+                                                                       index,
+                                                                       data,
+                                                                       label=None,
+                                                                       title=deltas[index],
+                                                                       color='#C21445')
+    return fig
+
+
+def plot_incoming_outgoing_histograms(control_type, data_incoming, data_outgoing):
+    """
+    Draws the empirical log data incoming + outgoing histograms of a defect type.
+
+    Args
+        :control_type (str): defect's control type
+        :data_incoming (Numpy array): incoming defects per hour
+        :data_outgoing (Numpy array): outgoing defects per hour
+    Returns
+        :fig (matplotlib Figure): figure
+    """
+    import matplotlib.pyplot as plt
+    visualization_functions = VisualizationFunctions()
+    fig, axs = plt.subplots (1, 2, figsize=(16,4))
+    # incoming_per_hour histogram
+    fig, axs = visualization_functions.visualize_histograms_theory(fig,
+                                                                   axs,
+                                                                   0,
+                                                                   data_incoming,
+                                                                   label='incoming',
+                                                                   title=f'{control_type} incoming [/hr]',
+                                                                   color='#C21445')
+    # outgoing_per_hour histogram
+    fig, axs = visualization_functions.visualize_histograms_theory(fig,
+                                                                   axs,
+                                                                   1,
+                                                                   data_outgoing,
+                                                                   label='outgoing',
+                                                                   title=f'{control_type} outgoing [/hr]',
+                                                                   color='#C21445')
+    return fig
+
+
+def plot_timeline_figures(control_type, timedeltas):
+    """
+    Draws the timelines tracking evolution of time deltas of a defect type.
+
+    Args
+        :control_type (str): defect's control type
+        :timedeltas (dict): dates and daily mean time deltas of the defect type (per delta)
+    Returns
+        :fig (matplotlib Figure): figure
+    """
+    import matplotlib.pyplot as plt
+    visualization_functions = VisualizationFunctions()
+    fig, axs = plt.subplots(1, 4, figsize=(16, 4))
+    deltas = ['Delta_New_Assign', 'Delta_Assign_InProgress', 'Delta_InProgress_Closed', 'Delta_New_Closed']
+    ylabels = ['time (hrs)', None, None, None]
+    for index in range(4):
+        # xdata = range(1,len(self.sub_deltas_df.select(deltas[index])) + 1)
+        # ydata = self.sub_deltas_df.select(deltas[index])
+        dates, ydata = timedeltas[deltas[index].lower()]
+        xdata = [datetime.datetime.strptime(key, "%Y-%m-%d").date() for key in dates]
+        fig, axs = visualization_functions.visualize_timeline(fig,
+                                                              axs,
+                                                              index,
+                                                              xdata,
+                                                              ydata,
+                                                              ylabel=ylabels[index],
+                                                              title=deltas[index])
+
+    fig.text(0.5, 0.95, f'{control_type}', ha='center', fontsize=12)
+    return fig
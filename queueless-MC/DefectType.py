@@ -1,11 +1,61 @@
 import polars as pl
-import queue
-import contextlib
+import numpy as np
 import datetime
-from LogEntry import LogEntry
 from BuildHistories import BuildHistories
 from abc import ABC
 
+STATES = ['new', 'assign', 'in-progress', 'closed']
+PLACEHOLDER_DATE = datetime.date(2025, 7, 28) # date of the states a defect has not reached yet
+
+
+def delta_hours(state_older, state_newer):
+    """
+    Expression of the time difference between two states of a defect, in hours (rounded to 3 decimals, NaN if the
+    defect has not reached both states)
+
+    Args
+        :state_older (str): older of the two states
+        :state_newer (str): more recent of the two states
+    Returns
+        :delta_hours (Polars Expr): time difference between the two states (hrs)
+    """
+    delta = pl.col(f'Timestamp_{state_newer}') - pl.col(f'Timestamp_{state_older}')
+    ### same float operations as timedelta.total_seconds()/3600, and the same rounding as round()
+    hours = delta.dt.total_microseconds() / 1e6 / 3600
+    return hours.map_batches(lambda s: pl.Series(round_decimals(s.to_numpy(), 3)), return_dtype=pl.Float64).fill_null(float('nan'))
+
+
+def round_decimals(values, decimals):
+    """
+    Rounds like round(value, decimals) on every value: np.round scales the values first, which turns values just off a
+    tie (e.g. 0.0025, stored slightly above) into exact ties rounded to even, so those are rounded by round() instead.
+
+    Args
+        :values (Numpy array): values to round (NaN kept)
+        :decimals (int): number of decimals
+    Returns
+        :rounded (Numpy array): rounded values
+    """
+    values = values.astype(np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10**decimals
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    rounded[near_tie] = [round(value, decimals) for value in values[near_tie].tolist()]
+    return rounded
+
+
+def state_date(state):
+    """
+    Expression of the date a defect reached a state (placeholder date if it has not reached it yet)
+
+    Args
+        :state (str): state of the defect
+    Returns
+        :state_date (Polars Expr): date of the state
+    """
+    return pl.col(f'Date_{state}').fill_null(PLACEHOLDER_DATE)
+
+
 class DefectType(ABC):
     def __init__(self, control_type, sub_log_df):
         self.control_type = control_type
@@ -13,7 +63,8 @@ class DefectType(ABC):
 
     def update_delta_table(self, empirical_dict):
         """
-        Triggers delta table update tracking time differences between state changes (per defect)
+        Triggers delta table update tracking time differences between state changes (per defect), in a single group-by
+        of the log by defect with the first timestamp and date of each state as columns
         
         Args
             :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type)
@@ -21,31 +72,24 @@ class DefectType(ABC):
             :sub_deltas_df (Polars DataFrame): subset of deltas_df (e.g. single control type)
             :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type) (adjusted)
         """
-        processing_queue = queue.Queue()
-        self.sub_deltas_df = pl.DataFrame(schema=[('Defect_ID',int),
-                                                  ('Control_Type',str),
-                                                  ('Delta_New_Assign',float),
-                                                  ('Date_Assign', datetime.date),
-                                                  ('Delta_Assign_InProgress',float),
-                                                  ('Date_InProgress', datetime.date),
-                                                  ('Delta_InProgress_Closed',float),
-                                                  ('Delta_New_Closed',float),
-                                                  ('Date_Closed', datetime.date)])
-        sub_deltas_dict = {}
-        for row in self.sub_log_df.iter_rows():
-            with contextlib.suppress(IndexError):
-                processing_queue.put(row[0], block=False)
-
-        while processing_queue.qsize() > 0: # takes previous 24h of data
-            with contextlib.suppress(queue.Empty):
-                row_id = processing_queue.get(block=False)
-            log_entry = LogEntry(row_id, self.sub_log_df, sub_deltas_dict)
-            sub_deltas_dict, empirical_dict = log_entry.check_state(empirical_dict)
-        for key in sub_deltas_dict.keys():
-            self.sub_deltas_df.extend(pl.DataFrame(sub_deltas_dict[key]))
+        timestamps = self.sub_log_df.group_by('Defect_ID', maintain_order=True).agg(
+            pl.col('Control_Type').first(),
+            ### first row of each state (per defect), as one column per state
+            *[pl.col(column).filter(pl.col('State') == state).first().alias(f'{column}_{state}')
+              for state in STATES for column in ('Timestamp', 'Date')]
+        ).filter(pl.col('Timestamp_new').is_not_null()) # the delta table tracks defects from their 'new' row on
+        self.sub_deltas_df = timestamps.select(pl.col('Defect_ID').cast(pl.Int64),
+                                               pl.col('Control_Type').cast(pl.String),
+                                               delta_hours('new', 'assign').alias('Delta_New_Assign'),
+                                               state_date('assign').alias('Date_Assign'),
+                                               delta_hours('assign', 'in-progress').alias('Delta_Assign_InProgress'),
+                                               state_date('in-progress').alias('Date_InProgress'),
+                                               delta_hours('in-progress', 'closed').alias('Delta_InProgress_Closed'),
+                                               delta_hours('new', 'closed').alias('Delta_New_Closed'),
+                                               state_date('closed').alias('Date_Closed'))
         return self.sub_deltas_df, empirical_dict
 
-    def update_histograms(self, log_df, deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict):
+    def update_histograms(self, log_df, deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict, figure_renderer=None, incremental=False):
         """
         Triggers empirical log data histograms and corresponding figures update (per defect type)
         
@@ -54,6 +98,8 @@ class DefectType(ABC):
             :incoming_dict (dict): tracks incoming defects per hour (per defect type)
             :outgoing_dict (dict): tracks outgoing defects per hour (per defect type)
             :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type)
+            :figure_renderer (FigureRenderer): collects the figures to render them all at once (rendered right away if None)
+            :incremental (bool): if log_df only holds the rows past the previous run (counts added to the stored ones)
         Returns
             :incoming_dict (dict): tracks incoming defects per hour (per defect type) (adjusted)
             :outgoing_dict (dict): tracks outgoing defects per hour (per defect type) (adjusted)
@@ -61,7 +107,7 @@ class DefectType(ABC):
         """
         # sub_deltas_df = deltas_df.filter(pl.col('Control_Type') == self.control_type).drop_nans()
         sub_deltas_df = deltas_df.filter(pl.col('Control_Type') == self.control_type)
-        histories = BuildHistories(self.control_type, log_df, sub_deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict)
+        histories = BuildHistories(self.control_type, log_df, sub_deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict, figure_renderer, incremental)
         if sub_deltas_df.is_empty() == 0:
             histories.update_empirical()
             histories.update_delta_histograms()
@@ -70,4 +116,6 @@ class DefectType(ABC):
             histories.update_incoming_outgoing_histograms()
             histories.update_timedeltas()
             histories.update_timeline_figures()
+            if figure_renderer is None:
+                histories.figure_renderer.render()
         return incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict
\ No newline at end of file
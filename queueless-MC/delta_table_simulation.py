@@ -3,17 +3,19 @@ import sys
 from ControlTypes import *
 # from DeltaSimulation import DefectType
 
-def delta_table_simulation(control_type, log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict):
+def delta_table_simulation(control_type, log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict, figure_renderer=None, open_log_df=None):
     """
     Builds delta table of time differences between state changes based on empirical log data
     
     Args
         :control_type (str): defect's control type
-        :log_df (Polars DataFrame): log data tracking state changes during a defect's lifetime
+        :log_df (Polars LazyFrame): log data tracking state changes during a defect's lifetime
         :deltas_df (Polars DataFrame): delta table tracking time deltas between state changes (per defect)
         :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type)
         :incoming_dict (dict): tracks incoming defects per hour (per defect type)
         :outgoing_dict (dict): tracks outgoing defects per hour (per defect type)
+        :figure_renderer (FigureRenderer): collects the figures to render them all at once (rendered right away if None)
+        :open_log_df (Polars LazyFrame): in incremental mode, log rows of the defects still open at the previous run (None otherwise)
     Returns
         :deltas_df (Polars DataFrame): delta table tracking time deltas between state changes (per defect) (adjusted)
         :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type) (adjusted)
@@ -21,8 +23,13 @@ def delta_table_simulation(control_type, log_df, deltas_df, empirical_dict, inco
         :outgoing_dict (dict): tracks outgoing defects per hour (per defect type) (adjusted)
     """
     sub_log_df = log_df.filter(pl.col('Control_Type') == control_type)
+    if open_log_df is not None:
+        ### earlier rows of the defects left open, so their deltas are computed from their 'new' row on
+        sub_log_df = pl.concat([open_log_df.filter(pl.col('Control_Type') == control_type), sub_log_df], how='vertical_relaxed')
+    sub_log_df = sub_log_df.collect(engine='streaming') # filter pushed down to the scan
     instance = getattr(sys.modules[__name__], control_type)(sub_log_df)
     sub_deltas_df, empirical_dict = instance.update_delta_table(empirical_dict)
-    deltas_df = pl.concat([deltas_df, sub_deltas_df]).unique()
-    incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict = instance.update_histograms(log_df, deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict)
+    ### upsert: the rows of the defects in the log replace their previous version, the rest of deltas_df is kept as is
+    deltas_df = pl.concat([deltas_df.join(sub_deltas_df.select('Defect_ID', 'Control_Type'), on=['Defect_ID', 'Control_Type'], how='anti'), sub_deltas_df])
+    incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict = instance.update_histograms(log_df, deltas_df, incoming_dict, outgoing_dict, timedeltas_dict, empirical_dict, figure_renderer, incremental=open_log_df is not None)
     return deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict
@@ -0,0 +1,41 @@
+import os
+import json
+import polars as pl
+
+PATH_HIGH_WATER_MARK = 'simulations/dicts/high_water_mark.json' # last log row processed
+PATH_OPEN_LOG = 'simulations/open_log.parquet'                   # log rows of the defects not closed yet
+
+
+def load_high_water_mark():
+    """
+    Reads the high-water mark of the previous incremental run: the ID and Timestamp of the last log row processed (log
+    IDs are expected to keep increasing from one export to the next).
+
+    Returns
+        :high_water_mark (dict): ID and Timestamp of the last log row processed (None if no incremental run yet)
+    """
+    if not os.path.exists(PATH_HIGH_WATER_MARK):
+        return None
+    with open(PATH_HIGH_WATER_MARK, 'r') as file:
+        return json.load(file)
+
+
+def export_incremental_state(log_df, open_log_df):
+    """
+    Stores the log rows of the defects not closed yet and the new high-water mark, for the next incremental run.
+
+    Args
+        :log_df (Polars LazyFrame): log rows processed by this run
+        :open_log_df (Polars LazyFrame): log rows of the defects still open at the previous run (None if first incremental run)
+    """
+    high_water_mark = log_df.select(pl.col('ID').max(), pl.col('Timestamp').max()).collect(engine='streaming')
+    if high_water_mark['ID'][0] is None:
+        return # no new rows, the state of the previous run still holds
+    columns = [column for column in log_df.collect_schema().names() if column not in ('Date', 'Hour')] # derived again on scan
+    processed_df = log_df if open_log_df is None else pl.concat([open_log_df, log_df], how='vertical_relaxed')
+    closed_df = processed_df.filter(pl.col('State') == 'closed').select('Defect_ID', 'Control_Type')
+    ### written next to the file being scanned, then swapped in
+    processed_df.join(closed_df, on=['Defect_ID', 'Control_Type'], how='anti').select(columns).sink_parquet(PATH_OPEN_LOG + '.tmp')
+    os.replace(PATH_OPEN_LOG + '.tmp', PATH_OPEN_LOG)
+    with open(PATH_HIGH_WATER_MARK, 'w') as file:
+        json.dump({'ID': high_water_mark['ID'][0], 'Timestamp': str(high_water_mark['Timestamp'][0])}, file)
@@ -2,6 +2,8 @@ import polars as pl
 import pickle
 import json
 import datetime
+import os
+from incremental_state import PATH_OPEN_LOG, load_high_water_mark
 
 def initialize_simulation(args):
     """
@@ -11,17 +13,23 @@ def initialize_simulation(args):
     Args
         :args (argparse parser.parse_args()): parsed input arguments
     Returns
-        :log_df (Polars DataFrame): log data tracking state changes during a defect's lifetime
+        :log_df (Polars LazyFrame): log data tracking state changes during a defect's lifetime, scanned lazily (see scan_logs)
         :deltas_df (Polars DataFrame): delta table tracking time deltas between state changes (per defect)
         :empirical_dict (dict): tracks incoming/outgoing and delta histograms from empirical data (per defect type)
         :incoming_dict (dict): tracks incoming defects per hour (per defect type)
         :outgoing_dict (dict): tracks outgoing defects per hour (per defect type)
         :control_types (list): list of control types in log data
+        :open_log_df (Polars LazyFrame): if --incremental is True, log rows of the defects still open at the previous run (None otherwise, or if first incremental run)
     """
-    log_df = pl.read_csv(args.path_logs)
-    log_df = log_df.with_columns(pl.col('Timestamp').str.strptime(pl.Datetime, '%Y-%d-%m %H:%M:%S'))
-    log_df = log_df.with_columns(pl.col("Timestamp").dt.date().alias("Date"))
-    log_df = log_df.with_columns(pl.col("Timestamp").dt.hour().alias("Hour"))
+    log_df = scan_logs(args.path_logs)
+    open_log_df = None
+    if args.incremental == 'True':
+        high_water_mark = load_high_water_mark()
+        if high_water_mark is not None:
+            ### only the rows past the previous run, plus the earlier rows of the defects it left open
+            print('High-water mark:', high_water_mark)
+            log_df = log_df.filter(pl.col('ID') > high_water_mark['ID'])
+            open_log_df = scan_logs(PATH_OPEN_LOG) if os.path.exists(PATH_OPEN_LOG) else log_df.clear()
 
     # if args.path_empirical_dict is None:
     #     empirical_dict = {}
@@ -58,7 +66,7 @@ def initialize_simulation(args):
                                        pl.col('Date_Closed').str.strptime(pl.Date, '%Y-%m-%d'))
 
 
-    control_types = log_df['Control_Type'].unique()
+    control_types = log_df.select(pl.col('Control_Type').unique(maintain_order=True)).collect(engine='streaming')['Control_Type'] # only reads the Control_Type column
     for control_type in control_types:
         if (not empirical_dict) or (control_type not in empirical_dict.keys()):
             empirical_dict[control_type] = {'incoming_per_hour': [],
@@ -79,4 +87,28 @@ def initialize_simulation(args):
                                             'delta_new_closed': {}
                                             }
 
-    return log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict, control_types
\ No newline at end of file
+    return log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict, control_types, open_log_df
+
+
+def scan_logs(path_logs):
+    """
+    Lazy scan of the log data, CSV or Parquet (.parquet), with the Timestamp parsing and the derived Date and Hour
+    columns fused into a single plan. Nothing is read until the plan is collected, so the per-control-type filters
+    downstream are pushed down to the scan, and collecting with engine='streaming' processes the file in batches
+    rather than loading it whole.
+
+    Args
+        :path_logs (str): path to the log data
+    Returns
+        :log_df (Polars LazyFrame): log data tracking state changes during a defect's lifetime
+    """
+    if path_logs.endswith('.parquet'):
+        log_df = pl.scan_parquet(path_logs)
+    else:
+        log_df = pl.scan_csv(path_logs)
+    timestamp = pl.col('Timestamp')
+    if log_df.collect_schema()['Timestamp'] == pl.String:
+        timestamp = timestamp.str.strptime(pl.Datetime, '%Y-%d-%m %H:%M:%S')
+    return log_df.with_columns(timestamp.alias('Timestamp'),
+                               timestamp.dt.date().alias('Date'),
+                               timestamp.dt.hour().alias('Hour'))
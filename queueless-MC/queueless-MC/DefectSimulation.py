@@ -1,9 +1,8 @@
 import numpy as np
 import heapq as hq
-import json
 import queue
 import contextlib
-from scipy.stats import skewnorm
+from DistributionCache import AliasTable, InverseCDF, load_distributions
 
 
 class DefectRemediationSimulator:
@@ -19,7 +18,8 @@ class DefectRemediationSimulator:
                  initial_backlogs,
                  t_end,
                  resources,
-                 resources_qmax):
+                 resources_qmax,
+                 seed=None):
         self.defect_types = defect_types
 
         if len(defect_priority) != len(defect_types):
@@ -60,6 +60,7 @@ class DefectRemediationSimulator:
         self.t_end = t_end
         self.resources = resources
         self.resources_qmax = resources_qmax
+        self.seed_sequence = np.random.SeedSequence(seed) # root of all the random streams, fresh entropy if seed is None
 
     def generate_type_dict(self):
         """
@@ -81,23 +82,61 @@ class DefectRemediationSimulator:
         }    
         self.defect_type_dict = defect_type_dict
         return defect_type_dict
+
+    def spawn_seed_sequences(self, seed_sequence, n):
+        """
+        Independent child seed sequences of seed_sequence. Unlike SeedSequence.spawn, the same children are returned on
+        every call, so a trial replays the same random streams however often it runs.
+
+        Args
+            :seed_sequence (Numpy SeedSequence): parent seed sequence
+            :n (int): number of child seed sequences
+        Returns
+            :children (list): child seed sequences (Numpy SeedSequence)
+        """
+        return [np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (i,)) for i in range(n)]
+
+    def trial_seed_sequences(self, trials):
+        """
+        Seed sequences of the Monte Carlo trials, one independent random stream per trial.
+
+        Args
+            :trials (int): number of trials
+        Returns
+            :seed_sequences (list): seed sequence of each trial (Numpy SeedSequence)
+        """
+        return self.spawn_seed_sequences(self.seed_sequence, trials)
+
+    def initialize_streams(self, seed_sequence):
+        """
+        Sets the random streams of a trial: one for the defect IDs, and one per defect type for each of the generation
+        and remediation histograms.
+
+        Args
+            :seed_sequence (Numpy SeedSequence): seeds the random streams of the trial (first trial of the simulation seed if None)
+        """
+        if seed_sequence is None:
+            seed_sequence = self.trial_seed_sequences(1)[0]
+        keys = list(self.defect_type_dict.keys())
+        id_root, generation_root, remediation_root = self.spawn_seed_sequences(seed_sequence, 3)
+        self.id_rng = np.random.default_rng(id_root)
+        self.generation_rngs = {key: np.random.default_rng(child) for key, child in zip(keys, self.spawn_seed_sequences(generation_root, len(keys)))}
+        self.remediation_rngs = {key: np.random.default_rng(child) for key, child in zip(keys, self.spawn_seed_sequences(remediation_root, len(keys)))}
     
     def import_distributions(self):
         """
-        Builds generation and remediation histograms from skewness coefficients.
+        Imports the empirical generation and remediation histograms, with their sampling tables: an alias table for the
+        incoming defects per hour (whole numbers) and an inverse CDF for the remediation times. Both are cached next to
+        the JSON files and only rebuilt when the files change (see DistributionCache.load_distributions).
 
-        Args
-            :size (int): samples in the skew-normal distributions
         Returns
             :incoming_distributions (dict): incoming defect incidence rate histograms (per defect type)
             :outgoing_distributions (dict): outgoing defect remediation time histograms (per defect type)
         """
         # distributions = []
-        with open('../simulations/generation_distributions.json', 'r') as f:
-            incoming_distributions = json.load(f)
-
-        with open('../simulations/remediation_distributions.json', 'r') as f:
-            outgoing_distributions = json.load(f)
+        incoming_distributions, self.generation_tables = load_distributions('../simulations/generation_distributions.json', AliasTable)
+        outgoing_distributions, self.remediation_tables = load_distributions('../simulations/remediation_distributions.json', InverseCDF)
+        # from scipy.stats import skewnorm
         # incoming_distributions = {}
         # outgoing_distributions = {}
         # for name in self.defect_types:
@@ -185,8 +224,8 @@ class DefectRemediationSimulator:
         #### INITIALIZATION OF THE BACKLOG ####
         for key in self.defect_type_dict.keys():
             for _ in range(self.defect_type_dict[key]['initial']):
-                defect_ID = f'ID_{str(np.random.randint(1, 1000000000))}'
-                remediation_time = np.random.choice(self.remediation_distributions[key], size=1, replace=True)
+                defect_ID = f'ID_{str(self.id_rng.integers(1, 1000000000))}'
+                remediation_time = self.remediation_tables[key].sample(self.remediation_rngs[key], 1)
                 defect_log[defect_ID] = {'defect_type': key, 't_created': t_start, 'remediation_time': remediation_time}
                 hq.heappush(backlog_queue, (self.defect_type_dict[key]['priority'], defect_ID)) # tuple (priority level, defect ID tag) will be sorted in heap based on priority
         return defect_log, backlog_queue
@@ -238,13 +277,13 @@ class DefectRemediationSimulator:
         """
         for key in incoming_defects_tracker.keys():
             incoming_defects_stored[key].append(incoming_defects_tracker[key][0])
-            defect_ID = [f'ID_{str(np.random.randint(1, 1000000000))}' for _ in range(int(incoming_defects_tracker[key][0]))] ### one defect ID per defect that came in in that hour
+            defect_ID = [f'ID_{str(self.id_rng.integers(1, 1000000000))}' for _ in range(int(incoming_defects_tracker[key][0]))] ### one defect ID per defect that came in in that hour
             priority_level = [self.defect_type_dict[key]['priority'] for _ in range(int(incoming_defects_tracker[key][0]))]
-            remediation_time = [np.random.choice(self.remediation_distributions[key], size=1, replace=True) for _ in range(int(incoming_defects_tracker[key][0]))]
+            remediation_time = self.remediation_tables[key].sample(self.remediation_rngs[key], int(incoming_defects_tracker[key][0])).reshape(-1, 1) # one array of 1 per defect
             defect_log.update({defect_ID[i]: {'defect_type': key, 't_created': t, 'remediation_time': remediation_time[i]} for i in range(int(incoming_defects_tracker[key][0]))})
             backlog_queue = backlog_queue + list(zip(priority_level, defect_ID))
             hq.heapify(backlog_queue)
-            incoming_defects_tracker[key] = np.random.choice(self.generation_distributions[key], size=1, replace=True) ### reinitialize the incoming_defects_tracker
+            incoming_defects_tracker[key] = self.generation_tables[key].sample(self.generation_rngs[key], 1) ### reinitialize the incoming_defects_tracker
         return incoming_defects_tracker, incoming_defects_stored, defect_log, backlog_queue
     
     def check_queues(self, n, t, queue_dict, defect_log, backlog_queue):
@@ -305,19 +344,21 @@ class DefectRemediationSimulator:
 
 
 
-    def simulate_defect_backlog(self, dt, initial_state):
+    def simulate_defect_backlog(self, dt, initial_state, seed_sequence=None):
         """
         The main defect backlog simulation pipeline.
 
         Args
             :dt (float): simulation time step, equivalent to 1/2 the minimum value among histograms (Nyquist sampling theorem)
             :initial_state (dict): initial state of the defect log prior to simulation
+            :seed_sequence (Numpy SeedSequence): seeds the random streams of the trial (first trial of the simulation seed if None)
         Returns
             :np.array(times) (Numpy array): time steps governing backlog simulation
             :incoming_defects_stored (dict): tracks the incoming defects generated throughout the simulation (per defect type)
             :defect_log (dict): simulation defect log
             :backlog_queue (list): heap (priority queue) of backlogged defects
         """
+        self.initialize_streams(seed_sequence)
         t_start = 0 # assume that starting time of the simulation is now to initialize
         t_end = self.t_end
         defect_log = {}
@@ -337,7 +378,7 @@ class DefectRemediationSimulator:
         queue_dict, defect_log, backlog_queue = self.initialize_queues(t_start, defect_log, backlog_queue)
 
         #### INITIALIZATION OF INCOMING DEFECT TRACKER ####
-        incoming_defects_tracker = {key: np.random.choice(self.generation_distributions[key], size=1, replace=True) for key in self.defect_type_dict.keys()}
+        incoming_defects_tracker = {key: self.generation_tables[key].sample(self.generation_rngs[key], 1) for key in self.defect_type_dict.keys()}
         incoming_defects_stored = {key: [] for key in self.defect_type_dict.keys()}
         hour = t_start + 1.0
 
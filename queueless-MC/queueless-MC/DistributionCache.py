@@ -0,0 +1,148 @@
+import hashlib
+import os
+import numpy as np
+
+
+class AliasTable:
+    """
+    Alias table (Vose) of a discrete empirical distribution, e.g. the number of incoming defects per hour: its distinct
+    values with one probability and one alias each, so a draw costs one random column and one uniform, whatever the
+    number of samples the distribution was built from.
+    """
+    def __init__(self, values, probability, alias):
+        self.values = values
+        self.probability = probability
+        self.alias = alias
+
+    @classmethod
+    def from_samples(cls, samples):
+        """
+        Builds the alias table of the empirical distribution of samples.
+
+        Args
+            :samples (array-like): samples of the distribution
+        Returns
+            :table (AliasTable): alias table
+        """
+        values, counts = np.unique(np.asarray(samples, dtype=float), return_counts=True)
+        scaled = counts * len(values) / counts.sum()
+        probability = np.ones(len(values))
+        alias = np.arange(len(values))
+        small = [index for index in range(len(values)) if scaled[index] < 1]
+        large = [index for index in range(len(values)) if scaled[index] >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less] # the rest of the column goes to the larger value
+            (small if scaled[more] < 1 else large).append(more)
+        return cls(values, probability, alias)
+
+    def arrays(self):
+        """
+        Returns the arrays of the table, by constructor argument.
+        """
+        return {'values': self.values, 'probability': self.probability, 'alias': self.alias}
+
+    def sample(self, rng, size):
+        """
+        Draws samples from the distribution.
+
+        Args
+            :rng (Numpy Generator): random stream
+            :size (int): number of samples
+        Returns
+            :samples (Numpy array): samples from the distribution
+        """
+        column = rng.integers(0, len(self.values), size=size)
+        return self.values[np.where(rng.random(size) < self.probability[column], column, self.alias[column])]
+
+
+class InverseCDF:
+    """
+    Inverse CDF of a continuous empirical distribution, e.g. remediation times, as its sorted samples: a uniform draw u
+    maps to the sample of rank floor(u * n).
+    """
+    def __init__(self, sorted_samples):
+        self.sorted_samples = sorted_samples
+
+    @classmethod
+    def from_samples(cls, samples):
+        """
+        Builds the inverse CDF of the empirical distribution of samples.
+
+        Args
+            :samples (array-like): samples of the distribution
+        Returns
+            :table (InverseCDF): inverse CDF
+        """
+        return cls(np.sort(np.asarray(samples, dtype=float)))
+
+    def arrays(self):
+        """
+        Returns the arrays of the table, by constructor argument.
+        """
+        return {'sorted_samples': self.sorted_samples}
+
+    def sample(self, rng, size):
+        """
+        Draws samples from the distribution.
+
+        Args
+            :rng (Numpy Generator): random stream
+            :size (int): number of samples
+        Returns
+            :samples (Numpy array): samples from the distribution
+        """
+        return self.sorted_samples[(rng.random(size) * len(self.sorted_samples)).astype(np.int64)]
+
+
+def load_distributions(path, table_class):
+    """
+    Reads the empirical distributions of a JSON file (one list of samples per defect type) as sampling tables, through a
+    cache persisted next to it (same name, .npz). The tables are built once, then read back from the cache as long as
+    the SHA-256 of the JSON file is unchanged, without parsing the JSON again.
+
+    Args
+        :path (str): path of the JSON file
+        :table_class (class): AliasTable (discrete values) or InverseCDF (continuous values)
+    Returns
+        :distributions (dict): samples of the distribution, sorted (per defect type, Numpy array)
+        :tables (dict): sampling tables (per defect type)
+    """
+    with open(path, 'rb') as file:
+        source = file.read()
+    source_hash = hashlib.sha256(source).hexdigest()
+    cache_path = os.path.splitext(path)[0] + '.npz'
+
+    #### CACHE HIT: SAME SOURCE DATA, SAME KIND OF TABLE ####
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            if str(cache['source_hash']) == source_hash and str(cache['table_class']) == table_class.__name__:
+                names = cache['names'].tolist()
+                samples = np.split(cache['samples'], cache['sample_offsets'])
+                fields = {key: np.split(cache[key], cache['table_offsets']) for key in cache['table_fields'].tolist()}
+                distributions = dict(zip(names, samples))
+                tables = {name: table_class(**{key: fields[key][index] for key in fields}) for index, name in enumerate(names)}
+                return distributions, tables
+
+    #### CACHE MISS: PARSE THE JSON AND BUILD THE TABLES ####
+    import json
+    source_dict = json.loads(source)
+    distributions = {name: np.sort(np.asarray(samples, dtype=float)) for name, samples in source_dict.items()}
+    tables = {name: table_class.from_samples(samples) for name, samples in distributions.items()}
+    ### one array per field for all the defect types, split at the offsets, so the cache holds a handful of arrays
+    table_arrays = [tables[name].arrays() for name in distributions.keys()]
+    table_fields = list(table_arrays[0].keys()) if table_arrays else []
+    with open(cache_path + '.tmp', 'wb') as file:
+        np.savez(file,
+                 source_hash=np.array(source_hash),
+                 table_class=np.array(table_class.__name__),
+                 names=np.array(list(distributions.keys()), dtype=str),
+                 samples=np.concatenate(list(distributions.values()) or [np.zeros(0)]),
+                 sample_offsets=np.cumsum([len(samples) for samples in distributions.values()])[:-1],
+                 table_fields=np.array(table_fields, dtype=str),
+                 table_offsets=np.cumsum([len(arrays[table_fields[0]]) for arrays in table_arrays])[:-1] if table_arrays else np.zeros(0, dtype=np.int64),
+                 **{key: np.concatenate([arrays[key] for arrays in table_arrays]) for key in table_fields})
+    os.replace(cache_path + '.tmp', cache_path) # a run reading the cache never sees it half written
+    return distributions, tables
@@ -30,13 +30,15 @@ def backlog_simulation(args, defect_simulation, dt):
     ####### BACKLOG SIMULATION ########
     incoming_defects_dict = {}
     comparison_dict = {}
+    seed_sequences = defect_simulation.trial_seed_sequences(trials) # one independent random stream per trial
+    print('Seed:', defect_simulation.seed_sequence.entropy) # pass as --seed to replay this simulation
     for i in range(trials):
         start = time.time()
         if check_initial_state:
             initial_state = loaded_dict['trial{0}'.format(i+1)]
         else:
             initial_state = {}
-        times, incoming_defects, defect_log, backlog_queue_remaining = defect_simulation.simulate_defect_backlog(dt, initial_state)
+        times, incoming_defects, defect_log, backlog_queue_remaining = defect_simulation.simulate_defect_backlog(dt, initial_state, seed_sequences[i])
         end = time.time()
         incoming_defects_dict['trial{0}'.format(i+1)] = incoming_defects
         if args.t_end != 0:
@@ -2,7 +2,6 @@ import argparse
 from DefectSimulation import DefectRemediationSimulator
 from initialize_simulation import initialize_simulation
 from backlog_simulation import backlog_simulation
-from visualize_simulation import visualize_simulation, visualize_generation_distributions, visualize_remediation_distributions
 
 
 #### INPUT PARAMETERS ####
@@ -17,6 +16,7 @@ parser.add_argument('--initial_backlogs', type=str, help="List initial number of
 parser.add_argument('--t_end', type=float, help='End time for remediation simulation, in hours')
 parser.add_argument('--resources', type=int, help='Available parallel resources for treatment of defects')
 parser.add_argument('--resources_qmax', type=int, help='Maxmimum resources that can be alloted at any given time for treatment of defects')
+parser.add_argument('--seed', type=int, default=None, help='Seed of the random streams of every trial, the same seed replays the same simulation; a fresh seed is drawn and printed if not given')
 parser.add_argument('--trials', type=int, help='Number of times to run the full simulation')
 parser.add_argument('--check_initial_state', default=False, help='If importing an existing simulation to continue, enter True; False otherwise')
 parser.add_argument('--path_initial_state', type=str, help="If --check_initial_state is True, provide the path to the existing simulation (example: 'initial_state_path.pkl')")
@@ -33,6 +33,7 @@ if __name__ == "__main__":
     incoming_defects_dict, comparison_dict = backlog_simulation(args, defect_simulation, dt)
     
     ####### VISUALIZATION #######
+    from visualize_simulation import visualize_simulation, visualize_generation_distributions, visualize_remediation_distributions # matplotlib only once the simulation is done
     visualize_simulation(comparison_dict)                                                                   # defect backlog
     visualize_generation_distributions(defect_type_dict, incoming_defects_dict, generation_distributions)   # number of incoming defects / hour distributions
     visualize_remediation_distributions(defect_type_dict, comparison_dict, remediation_distributions)       # remediation time distributions
\ No newline at end of file
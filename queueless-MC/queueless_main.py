@@ -7,12 +7,18 @@ from initialize_simulation_ql import initialize_simulation
 from delta_table_simulation import delta_table_simulation
 from fastworkflow_build import fastworkflow_build
 from queueing_build import queueing_build
+from utils.FigureRenderer import FigureRenderer
+from incremental_state import export_incremental_state
 
 
 
 parser = argparse.ArgumentParser(exit_on_error=False)
 ### TO DO: error if path_logs not provided
-parser.add_argument('--path_logs', type=str, help="Path to the log information (example: 'initial_state_path.pkl')")
+parser.add_argument('--path_logs', type=str, help="Path to the log information, CSV or Parquet (.parquet), scanned lazily in streaming mode (example: 'logs.csv')")
+parser.add_argument('--incremental', default=False, help='If only processing the log rows past the previous incremental run (high-water mark and defects still open kept in simulations/), enter True; False otherwise')
+parser.add_argument('--no_plots', default=False, help='If skipping the figures altogether (matplotlib is not even imported), enter True; False otherwise')
+parser.add_argument('--path_figures', type=str, default='figures', help="Directory of the PNG files, rendered headless (figures whose input data is unchanged are skipped) (example: 'figures')")
+parser.add_argument('--workers', type=int, default=1, help='Number of worker processes the figures are rendered across (1 = serial)')
 # parser.add_argument('--path_empirical_dict', type=str, default=None, help="Path to an existing empirical_dict (example: 'initial_state_path.pkl')")
 # parser.add_argument('--path_incoming_dict', type=str, default=None, help="Path to an existing incoming_dict (example: 'initial_state_path.pkl')")
 # parser.add_argument('--path_outgoing_dict', type=str, default=None, help="Path to an existing outgoing_dict (example: 'initial_state_path.pkl')")
@@ -25,10 +31,14 @@ if __name__ == "__main__":
     # initialize_simulation_ql(args)
     pl.Config.set_tbl_hide_dataframe_shape(True)
 
-    log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict, control_types = initialize_simulation(args)
+    log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict, control_types, open_log_df = initialize_simulation(args)
+    figure_renderer = FigureRenderer(args.path_figures, args.workers, enabled=args.no_plots != 'True')
     for control_type in control_types:
-        deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict = delta_table_simulation(control_type, log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict)
+        deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict = delta_table_simulation(control_type, log_df, deltas_df, empirical_dict, incoming_dict, outgoing_dict, timedeltas_dict, figure_renderer, open_log_df)
+    figure_renderer.render() # figures of every control type at once
     
+    if args.incremental == 'True':
+        control_types = list(empirical_dict.keys()) # control types without new rows keep their previous results
     fastworkflow_build(control_types, deltas_df, incoming_dict, outgoing_dict, timedeltas_dict)
     queueing_build(control_types, empirical_dict)
     
@@ -42,4 +52,8 @@ if __name__ == "__main__":
                 json.dump(eval(item), file)
         else:
             with open('simulations/deltas_df.json', 'wb') as f:
-                deltas_df.sort('Defect_ID').write_json(f)
\ No newline at end of file
+                deltas_df.sort('Defect_ID').write_json(f)
+
+    if args.incremental == 'True':
+        ### last, the high-water mark only moves once the results of the run are exported
+        export_incremental_state(log_df, open_log_df)
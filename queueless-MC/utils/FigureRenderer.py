@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import pickle
+
+
+class FigureRenderer:
+    """
+    Collects figures and renders them headless (Agg backend) as PNG files, spread across worker processes. A figure is
+    only rendered again when the content hash of its input data differs from the one of its last PNG (kept in
+    figure_hashes.json in output_dir, with the path of that PNG). With enabled=False, figures are dropped and
+    matplotlib is never imported.
+    """
+    def __init__(self, output_dir='figures', workers=1, enabled=True):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.enabled = enabled
+        self.jobs = []
+
+    def submit(self, name, file_name, plot_function, *data):
+        """
+        Queues a figure for rendering.
+
+        Args
+            :name (str): figure name, the same from one run to the next (content hash key)
+            :file_name (str): name of the PNG file in output_dir
+            :plot_function (function): plot function returning the figure (module level, so it can be sent to a worker)
+            :data: input data of the plot function
+        """
+        if self.enabled:
+            self.jobs.append((name, file_name, plot_function, data))
+
+    def render(self):
+        """
+        Renders the queued figures whose input data changed since their last PNG.
+
+        Returns
+            :paths (dict): path of the PNG file (per figure name)
+        """
+        if not self.jobs:
+            return {}
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest_path = os.path.join(self.output_dir, 'figure_hashes.json')
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as file:
+                manifest = json.load(file)
+
+        paths = {}
+        pending = []
+        for name, file_name, plot_function, data in self.jobs:
+            digest = self.content_hash(plot_function, data)
+            entry = manifest.get(name)
+            if isinstance(entry, dict) and entry['hash'] == digest and os.path.exists(entry['path']): # plain hashes of earlier versions are rendered again
+                paths[name] = entry['path'] # last PNG is still up to date
+                continue
+            paths[name] = os.path.join(self.output_dir, file_name)
+            manifest[name] = {'hash': digest, 'path': paths[name]}
+            pending.append((paths[name], plot_function, data))
+        self.jobs = []
+
+        if self.workers > 1 and len(pending) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                list(executor.map(render_figure, *zip(*pending)))
+        else:
+            for path, plot_function, data in pending:
+                render_figure(path, plot_function, data)
+
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=2)
+        return paths
+
+    def content_hash(self, plot_function, data):
+        """
+        SHA-256 of the plot function's name and of its pickled input data.
+        """
+        digest = hashlib.sha256(f'{plot_function.__module__}.{plot_function.__qualname__}'.encode())
+        digest.update(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        return digest.hexdigest()
+
+
+def render_figure(path, plot_function, data):
+    """
+    Draws a single figure with the Agg backend and saves it as a PNG file (module level, so it runs in a worker).
+
+    Args
+        :path (str): path of the PNG file
+        :plot_function (function): plot function returning the figure
+        :data (tuple): input data of the plot function
+    Returns
+        :path (str): path of the PNG file
+    """
+    import matplotlib
+    matplotlib.use('Agg') # non-interactive, never blocks on a window
+    import matplotlib.pyplot as plt
+    fig = plot_function(*data)
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+    return path